@@ -0,0 +1,25 @@
+#     Copyright 2020, Jeremy Schulman
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Benchmarks for the nwkatk-netmon collectors and exporters.  Each benchmark is a
+module that can be run directly, for example:
+
+    python -m benchmarks.nxapi_ifstatus
+
+The benchmarks.suite module runs the collector and exporter benchmarks for a
+range of interface counts and saves the results as JSON, see its docstring.
+The benchmarks.devicefarm module simulates devices and an InfluxDB server on
+localhost for end-to-end scale testing of nwka-netmon.
+"""
@@ -0,0 +1,462 @@
+#     Copyright 2020, Jeremy Schulman
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+A local device farm for end-to-end scale testing of nwka-netmon without network
+devices.  The farm serves, on localhost:
+
+    * Arista eAPI endpoints (JSON-RPC on /command-api)
+    * Cisco NX-API endpoints (XML on /ins)
+    * a fake InfluxDB write endpoint (/write)
+
+Each device has its own HTTPS port, using a self-signed certificate, and
+returns the synthetic outputs of benchmarks.payloads with the configured
+latency, jitter and error rate.  The farm writes the inventory CSV of the
+devices and a netmon config file that uses the inventory and the fake InfluxDB,
+and then periodically reports the polls and the samples received per second:
+
+    python -m benchmarks.devicefarm --eos 1000 --nxos 1000 --latency 0.05
+    NETWORK_USERNAME=admin NETWORK_PASSWORD=admin \\
+        nwka-netmon -C farm-netmon.toml --interval 30
+
+Each device uses a file descriptor for its listening socket, so the open files
+limit (ulimit -n) must be larger than the number of devices.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Dict, List, Tuple, Callable, Awaitable
+from collections import Counter
+from pathlib import Path
+from itertools import cycle
+import subprocess
+import tempfile
+import asyncio
+import random
+import json
+import time
+import zlib
+import ssl
+import csv
+import re
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+import click
+from lxml import etree
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from benchmarks.payloads import (
+    make_eapi_outputs,
+    make_nxapi_outputs,
+    ins_api_output,
+    ins_api_response,
+)
+
+# (status, content-type, content)
+Response = Tuple[int, str, bytes]
+Handler = Callable[[str, str, Dict[str, str], bytes], Awaitable[Response]]
+
+_STATUS_REASON = {200: "OK", 204: "No Content", 404: "Not Found", 500: "Error"}
+
+_re_nxapi_input = re.compile(rb"<input>(.*?)</input>", re.S)
+
+# the process wide counters reported by the farm
+stats = Counter()
+
+
+# -----------------------------------------------------------------------------
+#
+#                              HTTP Server
+#
+# -----------------------------------------------------------------------------
+
+
+async def serve_http(handler: Handler, reader, writer):
+    """ serve the HTTP/1.1 requests of one connection, with keep-alive """
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            method, path, _ = request_line.split(" ", 2)
+
+            headers = dict()
+            for line in filter(None, header_lines):
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            status, content_type, content = await handler(method, path, headers, body)
+
+            writer.write(
+                b"HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n"
+                % (
+                    status,
+                    _STATUS_REASON.get(status, "").encode(),
+                    content_type.encode(),
+                    len(content),
+                )
+            )
+            writer.write(content)
+            await writer.drain()
+
+            if headers.get("connection", "").lower() == "close":
+                break
+
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+
+    finally:
+        writer.close()
+
+
+# -----------------------------------------------------------------------------
+#
+#                              Simulated Devices
+#
+# -----------------------------------------------------------------------------
+
+
+class SimulatedDevice(object):
+    """
+    The base of the simulated devices; adds the response latency, with jitter,
+    and fails the configured fraction of the requests with a 500 status.
+    """
+
+    def __init__(self, name: str, latency: float, jitter: float, error_rate: float):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    async def handle(self, method, path, headers, body) -> Response:
+        stats["requests"] += 1
+
+        if delay := self.latency + random.uniform(-self.jitter, self.jitter):
+            await asyncio.sleep(max(delay, 0))
+
+        if random.random() < self.error_rate:
+            stats["errors"] += 1
+            return 500, "text/plain", b"simulated device error\n"
+
+        return self.respond(path, body)
+
+    def respond(self, path: str, body: bytes) -> Response:
+        raise NotImplementedError()
+
+
+class SimulatedEOS(SimulatedDevice):
+    """
+    The Arista eAPI device.  The command outputs are JSON encoded once per
+    interface count and shared by the devices.
+    """
+
+    def __init__(self, name: str, outputs: Dict[str, str], **kwargs):
+        super().__init__(name, **kwargs)
+        self.outputs = dict(outputs)
+        self.outputs["show hostname"] = json.dumps({"hostname": name, "fqdn": name})
+
+    def respond(self, path, body) -> Response:
+        if path != "/command-api":
+            return 404, "text/plain", b"not found\n"
+
+        request = json.loads(body)
+        results = list()
+
+        for cmd_num, cmd in enumerate(request["params"]["cmds"], start=1):
+            cmd = cmd["cmd"] if isinstance(cmd, dict) else cmd
+            if (output := self.outputs.get(cmd)) is None:
+                error = {
+                    "code": 1002,
+                    "message": f"CLI command {cmd_num} of "
+                    f"{len(request['params']['cmds'])} '{cmd}' failed: invalid command",
+                    "data": [{"errors": ["Invalid input"]}],
+                }
+                content = {"jsonrpc": "2.0", "id": request.get("id"), "error": error}
+                return 200, "application/json", json.dumps(content).encode()
+
+            if cmd == "show interfaces transceiver detail":
+                stats["polls"] += 1
+
+            results.append(output)
+
+        content = '{"jsonrpc": "2.0", "id": %s, "result": [%s]}' % (
+            json.dumps(request.get("id")),
+            ", ".join(results),
+        )
+        return 200, "application/json", content.encode()
+
+
+class SimulatedNXOS(SimulatedDevice):
+    """
+    The Cisco NX-API device.  The command output elements are XML encoded once
+    per interface count and shared by the devices.
+    """
+
+    def __init__(self, name: str, outputs: Dict[str, bytes], **kwargs):
+        super().__init__(name, **kwargs)
+        self.outputs = dict(outputs)
+        self.outputs["show hostname"] = ins_api_output(
+            "show hostname", b"<body><hostname>%s</hostname></body>" % name.encode()
+        )
+
+    def respond(self, path, body) -> Response:
+        if path != "/ins":
+            return 404, "text/plain", b"not found\n"
+
+        outputs = list()
+        for command in _re_nxapi_input.search(body).group(1).decode().split(";"):
+            command = command.strip()
+            if (output := self.outputs.get(command)) is None:
+                output = ins_api_output(
+                    command, b"<body/>", code=400, msg="Input CLI command error"
+                )
+
+            if command == "show interface transceiver details":
+                stats["polls"] += 1
+
+            outputs.append(output)
+
+        return 200, "text/xml", ins_api_response(outputs)
+
+
+def eos_outputs(if_count: int) -> Dict[str, str]:
+    ifs_dom, ifs_desc = make_eapi_outputs(if_count)
+    return {
+        "show interfaces transceiver detail": json.dumps(ifs_dom),
+        "show interfaces description": json.dumps(ifs_desc),
+    }
+
+
+def nxos_outputs(if_count: int) -> Dict[str, bytes]:
+    status_body, dom_body = make_nxapi_outputs(if_count)
+    return {
+        command: ins_api_output(command, etree.tostring(body))
+        for command, body in (
+            ("show interface status", status_body),
+            ("show interface transceiver details", dom_body),
+        )
+    }
+
+
+# -----------------------------------------------------------------------------
+#
+#                              Fake InfluxDB
+#
+# -----------------------------------------------------------------------------
+
+
+async def handle_influxdb_write(method, path, headers, body) -> Response:
+    """ count the samples and bytes of the line protocol writes """
+    if not path.startswith("/write"):
+        return 404, "text/plain", b"not found\n"
+
+    stats["write_bytes"] += len(body)
+
+    if encoding := headers.get("content-encoding"):
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS if encoding == "gzip" else 0)
+
+    stats["writes"] += 1
+    stats["samples"] += body.count(b"\n") + (not body.endswith(b"\n"))
+    return 204, "text/plain", b""
+
+
+# -----------------------------------------------------------------------------
+#
+#                              Farm Setup
+#
+# -----------------------------------------------------------------------------
+
+
+def make_ssl_context(certfile: str, keyfile: str) -> ssl.SSLContext:
+    """
+    returns the server SSL context; a self-signed certificate is created, using
+    the openssl command, when the certificate files are not provided.
+    """
+    if not certfile:
+        tmpdir = Path(tempfile.mkdtemp(prefix="devicefarm-"))
+        certfile, keyfile = str(tmpdir / "cert.pem"), str(tmpdir / "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes"]
+            + ["-subj", "/CN=localhost", "-days", "7"]
+            + ["-keyout", keyfile, "-out", certfile],
+            check=True,
+            capture_output=True,
+        )
+
+    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ssl_context.load_cert_chain(certfile, keyfile)
+    return ssl_context
+
+
+def write_inventory(path: Path, devices: List[Tuple[str, str, int]]):
+    with open(path, "w", newline="") as ofile:
+        writer = csv.writer(ofile)
+        writer.writerow(["host", "ipaddr", "os_name"])
+        for name, os_name, port in devices:
+            writer.writerow([name, f"127.0.0.1:{port}", os_name])
+
+
+def write_netmon_config(path: Path, inventory: Path, influxdb_port: int):
+    path.write_text(
+        f"""\
+# netmon config generated by benchmarks.devicefarm
+
+[defaults]
+    inventory = "{inventory.resolve()}"
+    credentials.username = "$NETWORK_USERNAME"
+    credentials.password = "$NETWORK_PASSWORD"
+    exporters = ["influxdb"]
+
+[collectors.ifdom]
+    use = "nwka_netmon.collectors:ifdom"
+
+[exporters.influxdb]
+    use = "nwka_netmon.exporters:influxdb"
+    config.server_url = "http://127.0.0.1:{influxdb_port}"
+    config.database = "netmon"
+
+[device_drivers.eos]
+    use = "nwka_netmon.device_drivers:arista.eos"
+    modules = ["nwkatk_netmon.collectors.ifdom.eapi"]
+
+[device_drivers.nxos]
+    use = "nwka_netmon.device_drivers:cisco.nxapi"
+    modules = ["nwkatk_netmon.collectors.ifdom.nxapi"]
+"""
+    )
+
+
+async def report(interval: float):
+    """ report the farm counters per second every interval """
+    prev, prev_time = Counter(), time.monotonic()
+
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        elapsed, delta = now - prev_time, stats - prev
+        prev, prev_time = stats.copy(), now
+
+        click.echo(
+            f"polls/s {delta['polls'] / elapsed:>9,.1f}  "
+            f"requests/s {delta['requests'] / elapsed:>9,.1f}  "
+            f"errors {delta['errors']:>6,}  "
+            f"samples/s {delta['samples'] / elapsed:>11,.0f}  "
+            f"write KiB/s {delta['write_bytes'] / elapsed / 1024:>9,.1f}"
+        )
+
+
+async def run_farm(devices: List[Tuple[SimulatedDevice, int]], options: Dict):
+    ssl_context = make_ssl_context(options["certfile"], options["keyfile"])
+
+    for device, port in devices:
+        await asyncio.start_server(
+            lambda r, w, handler=device.handle: serve_http(handler, r, w),
+            host="127.0.0.1",
+            port=port,
+            ssl=ssl_context,
+        )
+
+    await asyncio.start_server(
+        lambda r, w: serve_http(handle_influxdb_write, r, w),
+        host="127.0.0.1",
+        port=options["influxdb_port"],
+    )
+
+    click.echo(
+        f"serving {len(devices)} devices, "
+        f"fake InfluxDB on http://127.0.0.1:{options['influxdb_port']}"
+    )
+    await report(options["report_interval"])
+
+
+@click.command()
+@click.option("--eos", type=int, default=100, help="number of Arista EOS devices")
+@click.option("--nxos", type=int, default=100, help="number of Cisco NX-OS devices")
+@click.option(
+    "--interfaces",
+    default="48",
+    help="comma separated list of interface counts, assigned to devices in turn",
+)
+@click.option("--latency", type=float, default=0.05, help="response latency (sec)")
+@click.option("--jitter", type=float, default=0.02, help="latency jitter (sec)")
+@click.option("--error-rate", type=float, default=0.0, help="fraction of 500 errors")
+@click.option("--base-port", type=int, default=20000, help="port of the first device")
+@click.option("--influxdb-port", type=int, default=18086, help="fake InfluxDB port")
+@click.option("--certfile", help="TLS certificate file, default is self-signed")
+@click.option("--keyfile", help="TLS private key file")
+@click.option(
+    "--inventory",
+    type=click.Path(dir_okay=False),
+    default="farm-inventory.csv",
+    help="inventory CSV file to write",
+)
+@click.option(
+    "--config",
+    type=click.Path(dir_okay=False),
+    default="farm-netmon.toml",
+    help="netmon config file to write",
+)
+@click.option("--report-interval", type=float, default=10.0, help="seconds")
+def main(eos, nxos, interfaces, latency, jitter, error_rate, base_port, **options):
+    device_opts = dict(latency=latency, jitter=jitter, error_rate=error_rate)
+    if_counts = cycle(int(count) for count in interfaces.split(","))
+    cached_outputs = dict()
+
+    def outputs(make_outputs, if_count):
+        key = (make_outputs, if_count)
+        if key not in cached_outputs:
+            cached_outputs[key] = make_outputs(if_count)
+        return cached_outputs[key]
+
+    devices, inventory = list(), list()
+    ports = iter(range(base_port, base_port + eos + nxos))
+
+    for dev_num in range(eos):
+        name, port = f"eos{dev_num:05d}", next(ports)
+        out = outputs(eos_outputs, next(if_counts))
+        devices.append((SimulatedEOS(name, out, **device_opts), port))
+        inventory.append((name, "eos", port))
+
+    for dev_num in range(nxos):
+        name, port = f"nxos{dev_num:05d}", next(ports)
+        out = outputs(nxos_outputs, next(if_counts))
+        devices.append((SimulatedNXOS(name, out, **device_opts), port))
+        inventory.append((name, "nxos", port))
+
+    inventory_path = Path(options["inventory"])
+    write_inventory(inventory_path, inventory)
+    config_path = Path(options["config"])
+    write_netmon_config(config_path, inventory_path, options["influxdb_port"])
+    click.echo(f"wrote {inventory_path} and {config_path}")
+
+    try:
+        asyncio.run(run_farm(devices, options))
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        click.echo(f"totals: {dict(stats)}")
+
+
+if __name__ == "__main__":
+    main()
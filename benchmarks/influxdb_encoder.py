@@ -0,0 +1,152 @@
+#     Copyright 2020, Jeremy Schulman
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Microbenchmark of the InfluxDB line-protocol encoding.  Compares the prior
+per-line encoder, which chained the device and metric tags and escaped every tag
+value for every sample, with the InfluxDBLineEncoder.
+
+    python -m benchmarks.influxdb_encoder --samples 1000000
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from itertools import chain
+from types import SimpleNamespace
+import re
+import time
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+import click
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon import MetricBatch, timestamp_now
+from nwkatk_netmon.collectors import ifdom
+from nwkatk_netmon.exporters.influxdb import InfluxDBLineEncoder
+
+IFDOM_METRICS = ifdom.IFdomCollector.metrics
+INTERFACES_PER_DEVICE = 48
+
+
+def make_device_batches(samples: int):
+    """
+    returns the list of (device, batch) with the IF DOM metrics for enough
+    devices to produce the requested number of samples.
+    """
+    ts = timestamp_now()
+    per_device = INTERFACES_PER_DEVICE * len(IFDOM_METRICS)
+    device_batches = list()
+
+    for dev_num in range(max(samples // per_device, 1)):
+        device = SimpleNamespace(
+            name=f"switch{dev_num}",
+            tags={"host": f"switch{dev_num}", "site": "dc 1", "os_name": "eos"},
+        )
+        metrics = MetricBatch()
+
+        for if_num in range(INTERFACES_PER_DEVICE):
+            tags_id = metrics.add_tags(
+                {
+                    "if_name": f"Ethernet{if_num + 1}",
+                    "if_desc": f"uplink to peer, port={if_num}",
+                    "media": "100GBASE-SR4",
+                }
+            )
+            for metric_cls in IFDOM_METRICS:
+                value = 0 if metric_cls.__name__.endswith("StatusMetric") else -2.5
+                metrics.append(metric_cls, value, tags_id=tags_id, ts=ts)
+
+        device_batches.append((device, metrics.bind(device)))
+
+    return device_batches
+
+
+# -----------------------------------------------------------------------------
+# the prior encoder, kept here as the benchmark baseline
+# -----------------------------------------------------------------------------
+
+_re_escape_chars = re.compile(r"[\s,=]").sub
+
+
+def _escape_tag_value(value):
+    return _re_escape_chars(lambda mo: f"\\{mo.group()}", value)
+
+
+def _make_influxdb_metric(device_tags, name, value, ts, tags) -> str:
+    all_tags = chain(device_tags.items(), tags.items())
+    labels = ",".join(f"{tag}={_escape_tag_value(value)}" for tag, value in all_tags)
+    return f"{name},{labels} value={value} {ts * 1_000_000}"
+
+
+def encode_baseline(device_batches):
+    return [
+        "\n".join(
+            _make_influxdb_metric(device.tags, name, value, ts, tags)
+            for name, value, ts, tags in metrics
+        ).encode()
+        for device, metrics in device_batches
+    ]
+
+
+def encode_line_encoder(encoder, device_batches):
+    combined = MetricBatch()
+    for _, metrics in device_batches:
+        combined.extend(metrics)
+
+    return encoder.encode(combined)
+
+
+def run(func, *args):
+    start = time.perf_counter()
+    payloads = func(*args)
+    return time.perf_counter() - start, sum(map(len, payloads))
+
+
+@click.command()
+@click.option("--samples", type=int, default=1_000_000, help="number of samples")
+@click.option(
+    "--precision", type=click.Choice(["ns", "u", "ms", "s"]), default="ms",
+)
+def main(samples, precision):
+    device_batches = make_device_batches(samples)
+    samples = sum(len(metrics) for _, metrics in device_batches)
+    encoder = InfluxDBLineEncoder(precision=precision, integer_fields=True)
+
+    # the first pass of the line encoder renders the series prefixes, the
+    # second pass is the steady state of every following poll.
+
+    results = [
+        ("baseline", run(encode_baseline, device_batches)),
+        ("encoder-first", run(encode_line_encoder, encoder, device_batches)),
+        ("encoder", run(encode_line_encoder, encoder, device_batches)),
+    ]
+
+    click.echo(f"{samples} samples, precision={precision}")
+    click.echo(f"{'encoder':<14} {'seconds':>8} {'samples/s':>12} {'bytes':>12}")
+    for name, (elapsed, size) in results:
+        click.echo(
+            f"{name:<14} {elapsed:>8.3f} {samples / elapsed:>12,.0f} {size:>12,}"
+        )
+
+
+if __name__ == "__main__":
+    main()
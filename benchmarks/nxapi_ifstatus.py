@@ -0,0 +1,113 @@
+#     Copyright 2020, Jeremy Schulman
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Benchmark the NX-API "show interface status" lookup used by the IF DOM
+collector.  Compares the per-interface XPath search with the name-indexed table,
+for increasing interface counts.  The time per interface of the indexed table
+should remain flat, showing linear scaling, while the XPath search grows with
+the interface count.
+
+    python -m benchmarks.nxapi_ifstatus
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+import time
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+import click
+from lxml import etree
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon.collectors.ifdom.nxapi import _index_ifs_status
+
+
+def make_ifs_status(if_count: int) -> etree.Element:
+    """ returns a synthetic "show interface status" output body """
+    body = etree.Element("body")
+    table = etree.SubElement(body, "TABLE_interface")
+
+    for if_num in range(if_count):
+        row = etree.SubElement(table, "ROW_interface")
+        for tag, text in (
+            ("interface", f"Ethernet{if_num // 48 + 1}/{if_num % 48 + 1}"),
+            ("name", f"uplink to peer port {if_num}"),
+            ("state", "connected"),
+            ("vlan", "routed"),
+            ("duplex", "full"),
+            ("speed", "100G"),
+            ("type", "QSFP-100G-SR4"),
+        ):
+            etree.SubElement(row, tag).text = text
+
+    return body
+
+
+def lookup_xpath(ifs_status, if_names):
+    for if_name in if_names:
+        ifs_status.xpath(f'TABLE_interface/ROW_interface[interface="{if_name}"]')[0]
+
+
+def lookup_indexed(ifs_status, if_names):
+    index = _index_ifs_status(ifs_status)
+    for if_name in if_names:
+        index[if_name]
+
+
+def timeit(func, *args, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@click.command()
+@click.option(
+    "--counts",
+    default="48,96,192,384,768,1536",
+    help="comma separated list of interface counts",
+)
+@click.option("--repeat", type=int, default=5, help="repeat count, best is used")
+def main(counts, repeat):
+    click.echo(f"{'interfaces':>10} {'xpath us/if':>12} {'indexed us/if':>14}")
+
+    for if_count in map(int, counts.split(",")):
+        ifs_status = make_ifs_status(if_count)
+        if_names = [
+            row.findtext("interface") for row in ifs_status.iter("ROW_interface")
+        ]
+
+        xpath_time = timeit(lookup_xpath, ifs_status, if_names, repeat=repeat)
+        index_time = timeit(lookup_indexed, ifs_status, if_names, repeat=repeat)
+
+        click.echo(
+            f"{if_count:>10} "
+            f"{xpath_time / if_count * 1e6:>12.2f} "
+            f"{index_time / if_count * 1e6:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
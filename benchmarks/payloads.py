@@ -0,0 +1,227 @@
+#     Copyright 2020, Jeremy Schulman
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Synthetic device command outputs, and fake devices that return them, used by
+the benchmarks.  The outputs have the structure that the IF DOM collectors
+use: the Arista EOS "show interfaces transceiver detail" and "show interfaces
+description" JSON, and the Cisco NX-OS "show interface status" and "show
+interface transceiver details" XML.  The values vary per interface so that
+the status thresholds are exercised.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from types import SimpleNamespace
+from contextlib import asynccontextmanager
+import random
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+from lxml import etree
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon.drivers.nxapi import Device as NXAPIDevice
+
+__all__ = [
+    "make_eapi_outputs",
+    "make_nxapi_outputs",
+    "ins_api_output",
+    "ins_api_response",
+    "FakeEAPIDevice",
+    "FakeNXAPIDevice",
+]
+
+# the interfaces per linecard used to name the chassis interfaces
+_PORTS_PER_SLOT = 48
+
+# the transceiver fields, the (low, high) range of the generated values, and the
+# (lowAlarm, lowWarn, highWarn, highAlarm) thresholds.
+
+_EAPI_FIELDS = {
+    "txPower": ((-8.0, 4.0), (-7.0, -6.0, 3.0, 4.0)),
+    "rxPower": ((-12.0, 4.0), (-11.0, -10.0, 3.0, 4.0)),
+    "temperature": ((20.0, 80.0), (-5.0, 0.0, 70.0, 75.0)),
+    "voltage": ((3.1, 3.5), (2.9, 3.0, 3.5, 3.6)),
+}
+
+_NXAPI_FIELDS = {
+    "temperature": ("temp_flag", (20.0, 80.0), (70.0, 75.0)),
+    "voltage": ("volt_flag", (3.1, 3.5), (3.45, 3.5)),
+    "tx_pwr": ("tx_pwr_flag", (-8.0, 4.0), (3.0, 4.0)),
+    "rx_pwr": ("rx_pwr_flag", (-12.0, 4.0), (3.0, 4.0)),
+}
+
+
+def _if_names(if_count: int, prefix: str):
+    for if_num in range(if_count):
+        yield f"{prefix}{if_num // _PORTS_PER_SLOT + 1}/{if_num % _PORTS_PER_SLOT + 1}"
+
+
+def make_eapi_outputs(if_count: int, seed: int = 0):
+    """
+    returns the EAPI JSON outputs of "show interfaces transceiver detail" and
+    "show interfaces description" for a device with `if_count` interfaces.
+    About one in ten interfaces is link-down.
+    """
+    rand = random.Random(seed)
+    ifs_dom, ifs_desc = dict(), dict()
+
+    for if_name in _if_names(if_count, "Ethernet"):
+        if_dom = {"mediaType": "100GBASE-SR4", "details": dict()}
+        for field, ((low, high), thresholds) in _EAPI_FIELDS.items():
+            if_dom[field] = round(rand.uniform(low, high), 2)
+            if_dom["details"][field] = dict(
+                zip(("lowAlarm", "lowWarn", "highWarn", "highAlarm"), thresholds)
+            )
+
+        ifs_dom[if_name] = if_dom
+        ifs_desc[if_name] = {
+            "description": f"uplink to peer {if_name}",
+            "interfaceStatus": "up" if rand.random() > 0.1 else "down",
+            "lineProtocolStatus": "up",
+        }
+
+    return {"interfaces": ifs_dom}, {"interfaceDescriptions": ifs_desc}
+
+
+def make_nxapi_outputs(if_count: int, seed: int = 0):
+    """
+    returns the NX-API "show interface status" and "show interface transceiver
+    details" output body elements for a device with `if_count` interfaces.
+    About one in ten interfaces is not-connected, and one in twenty has no
+    transceiver.
+    """
+    rand = random.Random(seed)
+    status_body = etree.Element("body")
+    status_table = etree.SubElement(status_body, "TABLE_interface")
+    dom_body = etree.Element("body")
+    dom_table = etree.SubElement(dom_body, "TABLE_interface")
+
+    for if_name in _if_names(if_count, "Ethernet"):
+        row = etree.SubElement(status_table, "ROW_interface")
+        state = "connected" if rand.random() > 0.1 else "notconnec"
+        for tag, text in (
+            ("interface", if_name),
+            ("name", f"uplink to peer {if_name}"),
+            ("state", state),
+            ("vlan", "routed"),
+            ("duplex", "full"),
+            ("speed", "100G"),
+            ("type", "QSFP-100G-SR4"),
+        ):
+            etree.SubElement(row, tag).text = text
+
+        row = etree.SubElement(dom_table, "ROW_interface")
+        etree.SubElement(row, "interface").text = if_name
+
+        if rand.random() < 0.05:
+            etree.SubElement(row, "sfp").text = "not present"
+            continue
+
+        for tag, text in (
+            ("sfp", "present"),
+            ("type", "QSFP-100G-SR4"),
+            ("name", "CISCO-FINISAR"),
+            ("partnum", "FTLC9551REPM-C"),
+            ("serialnum", f"FNS{rand.randrange(10**8):08d}"),
+        ):
+            etree.SubElement(row, tag).text = text
+
+        for field, (flag, (low, high), (warn, alarm)) in _NXAPI_FIELDS.items():
+            value = round(rand.uniform(low, high), 2)
+            etree.SubElement(row, field).text = f"{value}"
+            etree.SubElement(row, flag).text = (
+                "++" if value >= alarm else "+" if value >= warn else ""
+            )
+
+    return status_body, dom_body
+
+
+def ins_api_output(command: str, body: bytes, code: int = 200, msg="Success"):
+    """ returns the ins_api output element, as bytes, of the command output body """
+    return (
+        b"<output>%s<input>%s</input><msg>%s</msg><code>%d</code></output>"
+        % (body, command.encode(), msg.encode(), code)
+    )
+
+
+def ins_api_response(outputs) -> bytes:
+    """ returns the ins_api response of the command output elements """
+    return (
+        b'<?xml version="1.0"?><ins_api><type>cli_show</type><version>1.0</version>'
+        b"<sid>eoc</sid><outputs>%s</outputs></ins_api>" % b"".join(outputs)
+    )
+
+
+class FakeEAPIDevice(object):
+    """ a fake Arista EOS device that returns the synthetic EAPI outputs """
+
+    def __init__(self, name: str, if_count: int):
+        self.name = name
+        self.tags = {"host": name, "os_name": "eos"}
+        outputs = make_eapi_outputs(if_count)
+
+        async def exec(commands):  # noqa
+            return [SimpleNamespace(ok=True, output=output) for output in outputs]
+
+        self.eapi = SimpleNamespace(exec=exec)
+
+
+class FakeNXAPIDevice(NXAPIDevice):
+    """
+    A fake Cisco NX-OS device that returns the synthetic NX-API outputs.  The
+    transceiver details are streamed, in chunks, through the driver
+    `stream_rows` parser.
+    """
+
+    def __init__(self, name: str, if_count: int, chunk_size: int = 1 << 16):
+        super().__init__(name)
+        self.tags = {"host": name, "os_name": "nxos"}
+        status_body, dom_body = make_nxapi_outputs(if_count)
+        dom_output = ins_api_output(
+            "show interface transceiver details", etree.tostring(dom_body)
+        )
+        dom_response = ins_api_response([dom_output])
+
+        async def exec(commands):  # noqa
+            return [SimpleNamespace(ok=True, output=status_body)]
+
+        self.nxapi = SimpleNamespace(exec=exec)
+        self.httpx = _FakeStreamClient(dom_response, chunk_size)
+
+
+class _FakeStreamClient(object):
+    def __init__(self, content: bytes, chunk_size: int):
+        self.content = content
+        self.chunk_size = chunk_size
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):  # noqa
+        yield self
+
+    def raise_for_status(self):
+        pass
+
+    async def aiter_bytes(self):
+        content, chunk_size = self.content, self.chunk_size
+        for offset in range(0, len(content), chunk_size):
+            yield content[offset : offset + chunk_size]
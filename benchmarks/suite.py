@@ -0,0 +1,264 @@
+#     Copyright 2020, Jeremy Schulman
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Benchmark suite of the IF DOM collectors and the exporter encoders, using the
+synthetic device outputs of benchmarks.payloads, for increasing interface
+counts.  Each benchmark reports the throughput, the best of the repeat runs,
+and the peak memory allocated during a run as measured by tracemalloc.
+
+The results are saved as JSON, together with the git commit, so that the
+results of two commits can be compared:
+
+    python -m benchmarks.suite --output before.json
+    git checkout <other-commit>
+    python -m benchmarks.suite --output after.json --compare before.json
+
+The --loop option selects the event loop the collectors run on, so that the
+asyncio and uvloop loops can be compared in the same way.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Callable, Dict, List
+from datetime import datetime, timezone
+from pathlib import Path
+import subprocess
+import platform
+import tracemalloc
+import asyncio
+import json
+import time
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+import click
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon import MetricBatch, timestamp_now
+from nwkatk_netmon.collectors import ifdom
+from nwkatk_netmon.collectors.ifdom import eapi as ifdom_eapi
+from nwkatk_netmon.collectors.ifdom import nxapi as ifdom_nxapi
+from nwkatk_netmon.exporters.influxdb import InfluxDBLineEncoder
+from nwkatk_netmon.exporters.circonus import CirconusJSONEncoder
+from nwkatk_netmon.exporters.prometheus import ExpositionCache
+from nwkatk_netmon.eventloop import LoopModel, new_event_loop
+
+from benchmarks.payloads import FakeEAPIDevice, FakeNXAPIDevice, make_eapi_outputs
+
+
+class Benchmark(object):
+    """
+    A benchmark of `run`, a function without arguments, that processes `items`
+    items, interfaces or samples, per run.
+    """
+
+    def __init__(self, name: str, unit: str, items: int, run: Callable[[], None]):
+        self.name = name
+        self.unit = unit
+        self.items = items
+        self.run = run
+
+    def measure(self, repeat: int) -> Dict:
+        # warm-up run, so that the series registry caches are filled as they
+        # would be in the steady state.
+
+        self.run()
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            self.run()
+            best = min(best, time.perf_counter() - start)
+
+        tracemalloc.start()
+        self.run()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            "name": self.name,
+            "items": self.items,
+            "unit": self.unit,
+            "seconds": best,
+            "per_second": self.items / best,
+            "peak_bytes": peak_bytes,
+        }
+
+
+def make_benchmarks(if_count: int) -> List[Benchmark]:
+    """ returns the benchmarks for devices with `if_count` interfaces """
+    loop = asyncio.get_event_loop()
+    config = ifdom.IFdomCollectorConfig()
+
+    eapi_device = FakeEAPIDevice(f"eos-{if_count}", if_count)
+    nxapi_device = FakeNXAPIDevice(f"nxos-{if_count}", if_count)
+
+    def run_collector(module, device):
+        def run():
+            loop.run_until_complete(module.get_dom_metrics(device, config=config))
+
+        return run
+
+    # the metric construction alone, from the EAPI output already parsed.
+
+    ifs_dom, ifs_desc = make_eapi_outputs(if_count)
+    ifs_desc = ifs_desc["interfaceDescriptions"]
+
+    def run_make_if_metrics():
+        metrics = MetricBatch()
+        ts = timestamp_now()
+        for if_name, if_dom_data in ifs_dom["interfaces"].items():
+            ifdom_eapi._make_if_metrics(
+                metrics, if_name, if_dom_data, ifs_desc[if_name]["description"], ts
+            )
+
+    # the exporters encode the bound batch of the device metrics.
+
+    metrics = loop.run_until_complete(
+        ifdom_eapi.get_dom_metrics(eapi_device, config=config)
+    ).bind(eapi_device)
+
+    influxdb = InfluxDBLineEncoder(precision="ms")
+    circonus = CirconusJSONEncoder()
+    prometheus = ExpositionCache(stale_after=300)
+
+    return [
+        Benchmark(
+            "eapi.get_dom_metrics",
+            "interfaces",
+            if_count,
+            run_collector(ifdom_eapi, eapi_device),
+        ),
+        Benchmark(
+            "nxapi.get_dom_metrics",
+            "interfaces",
+            if_count,
+            run_collector(ifdom_nxapi, nxapi_device),
+        ),
+        Benchmark("eapi._make_if_metrics", "interfaces", if_count, run_make_if_metrics),
+        Benchmark(
+            "influxdb.encode", "samples", len(metrics), lambda: influxdb.encode(metrics)
+        ),
+        Benchmark(
+            "circonus.encode", "samples", len(metrics), lambda: circonus.encode(metrics)
+        ),
+        Benchmark(
+            "prometheus.update",
+            "samples",
+            len(metrics),
+            lambda: prometheus.update(metrics),
+        ),
+    ]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: List[Dict], baseline: Dict):
+    """ print the throughput and peak memory ratios versus the baseline """
+    base = {(res["name"], res["items"]): res for res in baseline["results"]}
+    click.echo(f"\ncompared with {baseline['commit']}:")
+
+    for res in results:
+        if not (base_res := base.get((res["name"], res["items"]))):
+            continue
+
+        speed = res["per_second"] / base_res["per_second"]
+        memory = res["peak_bytes"] / max(base_res["peak_bytes"], 1)
+        click.echo(
+            f"{res['name']:<24} {res['items']:>8} "
+            f"throughput x{speed:>6.2f}  peak memory x{memory:>6.2f}"
+        )
+
+
+@click.command()
+@click.option(
+    "--counts",
+    default="48,96,384,1000,2000",
+    help="comma separated list of interface counts",
+)
+@click.option("--repeat", type=int, default=5, help="repeat count, best is used")
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    default="netmon-benchmark.json",
+    help="JSON results file",
+)
+@click.option(
+    "--compare",
+    "baseline",
+    type=click.File(),
+    help="JSON results file of a previous run to compare with",
+)
+@click.option(
+    "--loop",
+    "loop_type",
+    type=click.Choice(["asyncio", "uvloop"]),
+    default="asyncio",
+    help="event loop used to run the collectors",
+)
+def main(counts, repeat, output, baseline, loop_type):
+    new_event_loop(LoopModel(), loop_type)
+    results = list()
+
+    click.echo(
+        f"{'benchmark':<24} {'items':>8} {'unit':<10} "
+        f"{'per second':>14} {'peak KiB':>10}"
+    )
+
+    for if_count in map(int, counts.split(",")):
+        for benchmark in make_benchmarks(if_count):
+            res = benchmark.measure(repeat=repeat)
+            results.append(res)
+            click.echo(
+                f"{res['name']:<24} {res['items']:>8} {res['unit']:<10} "
+                f"{res['per_second']:>14,.0f} {res['peak_bytes'] / 1024:>10,.1f}"
+            )
+
+    report = {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "loop": loop_type,
+        "repeat": repeat,
+        "results": results,
+    }
+
+    Path(output).write_text(json.dumps(report, indent=2))
+    click.echo(f"\nresults saved to {output}")
+
+    if baseline:
+        compare(results, json.load(baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,14 +12,35 @@
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
 
-from typing import Any, Mapping
+from typing import Any, Mapping, Type, Tuple, Callable, Iterable, List, Optional
+from itertools import compress
 import time
+import operator
+from contextvars import ContextVar
+from array import array
+from functools import lru_cache
 from base64 import encodebytes
 
 
 from pydantic import dataclasses, PositiveInt, Field, fields
+from pydantic.types import ConstrainedInt
 
-__all__ = ["Metric", "timestamp_now", "b64encodestr"]
+from nwkatk_netmon.series import series_registry
+
+__all__ = [
+    "Metric",
+    "MetricBatch",
+    "metric_schema",
+    "timestamp_now",
+    "timestamp_tick",
+    "tick_timestamp",
+    "b64encodestr",
+]
+
+# the scheduled tick time, in milli-seconds, of the running collection; set by
+# the TickScheduler for each job it fires.
+
+tick_timestamp = ContextVar("tick_timestamp", default=None)
 
 
 def timestamp_now():
@@ -27,6 +48,14 @@ def timestamp_now():
     return int(time.time() * 1000)
 
 
+def timestamp_tick():
+    """
+    returns the scheduled tick time of the running collection in milli-seconds,
+    or the current time when not called from a scheduled collection.
+    """
+    return tick_timestamp.get() or timestamp_now()
+
+
 def b64encodestr(str_value):
     return encodebytes(bytes(str_value, encoding="utf-8")).replace(b"\n", b"")
 
@@ -63,3 +92,271 @@ class Metric:
 
         if isinstance(self.tags, fields.FieldInfo):
             self.tags = self.tags.default_factory()
+
+
+# -----------------------------------------------------------------------------
+#
+#                              Metric Batches
+#
+# -----------------------------------------------------------------------------
+
+
+@lru_cache(maxsize=None)
+def metric_schema(metric_cls: Type[Metric]) -> Tuple[str, Callable[[Any], Any]]:
+    """
+    Returns the metric name and value coercion function for the given Metric
+    subclass.  The Metric declaration is checked once, here, so that adding
+    samples to a MetricBatch does not run the pydantic validators per sample.
+
+    Parameters
+    ----------
+    metric_cls:
+        The Metric subclass that declares the `name` default and the `value`
+        type annotation.
+
+    Raises
+    ------
+    TypeError
+        When the Metric subclass does not provide a default `name` value.
+    """
+    dc_fields = metric_cls.__dataclass_fields__
+    name = dc_fields["name"].default
+
+    if not isinstance(name, str):
+        raise TypeError(f"Metric {metric_cls.__name__}: missing default name value")
+
+    return name, _value_coercer(metric_cls, dc_fields["value"].type)
+
+
+def _value_coercer(metric_cls, value_type) -> Callable[[Any], Any]:
+    """
+    Create the function used to coerce and check a metric sample value based on
+    the Metric `value` type annotation.
+    """
+    if value_type is Any:
+        return lambda value: value
+
+    if isinstance(value_type, type) and issubclass(value_type, ConstrainedInt):
+        return _constrained_int_coercer(metric_cls, value_type)
+
+    if value_type in (float, int, str):
+        return value_type
+
+    # for any other annotation use the pydantic field validator; slower, but
+    # keeps the same semantics as creating the Metric instance.
+
+    value_field = metric_cls.__pydantic_model__.__fields__["value"]
+
+    def coerce(value):
+        value, errors = value_field.validate(value, {}, loc="value")
+        if errors:
+            raise ValueError(f"Metric {metric_cls.__name__}: invalid value: {errors}")
+        return value
+
+    return coerce
+
+
+def _constrained_int_coercer(metric_cls, value_type) -> Callable[[Any], int]:
+    limits = [
+        (limit, op)
+        for limit, op in (
+            (value_type.ge, operator.ge),
+            (value_type.gt, operator.gt),
+            (value_type.le, operator.le),
+            (value_type.lt, operator.lt),
+        )
+        if limit is not None
+    ]
+
+    def coerce(value):
+        value = int(value)
+        if not all(op(value, limit) for limit, op in limits):
+            raise ValueError(
+                f"Metric {metric_cls.__name__}: value {value} out of range"
+            )
+        return value
+
+    return coerce
+
+
+class MetricBatch(object):
+    """
+    A MetricBatch is a columnar collection of metric samples that is produced by
+    a collector and consumed by an Exporter.  Rather than creating a Metric
+    instance per sample, the sample name, value, timestamp and tag-set id are
+    stored in parallel arrays.  The Metric subclasses remain the schema
+    declarations; see `metric_schema`.
+
+    Tag mappings are interned in the shared series registry and referenced by
+    id, so that all metrics for an interface share the same tag-set.  Before a
+    batch is exported it is bound to the device, see `bind`, which assigns the
+    series id for each sample.  Exporters use the series id to obtain their
+    pre-rendered series key.
+
+    Examples
+    --------
+    batch = MetricBatch()
+    tags_id = batch.add_tags({"if_name": "Ethernet1"})
+    batch.append(IFdomRxPowerMetric, value=-2.3, tags_id=tags_id, ts=ts)
+
+    for name, value, ts, tags in batch:
+        ...
+    """
+
+    __slots__ = (
+        "names",
+        "values",
+        "timestamps",
+        "tagset_ids",
+        "series_ids",
+        "device_tags_id",
+    )
+
+    def __init__(self):
+        self.names: List[str] = list()
+        self.values: List[Any] = list()
+        self.timestamps = array("q")
+        self.tagset_ids = array("l")
+        self.series_ids: Optional[array] = None
+        self.device_tags_id: Optional[int] = None
+
+    @classmethod
+    def from_metrics(cls, metrics: Iterable[Metric]) -> "MetricBatch":
+        """ create a batch from a collection of Metric instances """
+        batch = cls()
+        for metric in metrics:
+            batch.add_metric(metric)
+        return batch
+
+    def to_metrics(self) -> List[Metric]:
+        """ returns the samples as Metric instances, with the metric tags only """
+        return [
+            Metric(name=name, value=value, ts=ts, tags=dict(tags))
+            for name, value, ts, tags in self
+        ]
+
+    @staticmethod
+    def add_tags(tags: Mapping) -> int:
+        """
+        Intern the tag-set into the series registry and return the tag-set id
+        used when appending samples.
+        """
+        return series_registry.intern_tags(tags)
+
+    def append(
+        self,
+        metric_cls: Type[Metric],
+        value: Any,
+        tags_id: int,
+        ts: Optional[int] = None,
+    ):
+        """ append a sample for the given Metric type to the batch """
+        name, coerce = metric_schema(metric_cls)
+        self.values.append(coerce(value))
+        self.names.append(name)
+        self.timestamps.append(ts or timestamp_tick())
+        self.tagset_ids.append(tags_id)
+
+    def writer(self, metric_cls: Type[Metric]) -> Callable[[Any, int, int], None]:
+        """
+        Returns a function (value, tags_id, ts) that appends samples of the
+        given Metric type.  Used in collector loops to avoid the per-sample
+        schema lookup.
+        """
+        name, coerce = metric_schema(metric_cls)
+        names, values = self.names, self.values
+        timestamps, tagset_ids = self.timestamps, self.tagset_ids
+
+        def append(value, tags_id, ts):
+            values.append(coerce(value))
+            names.append(name)
+            timestamps.append(ts)
+            tagset_ids.append(tags_id)
+
+        return append
+
+    def add_metric(self, metric: Metric):
+        """ append an existing Metric instance to the batch """
+        self.names.append(metric.name)
+        self.values.append(metric.value)
+        self.timestamps.append(metric.ts)
+        self.tagset_ids.append(self.add_tags(metric.tags))
+
+    def bind(self, device) -> "MetricBatch":
+        """
+        Assign the series id for each sample using the device tags.  If the batch
+        is already bound to the same device tags, then nothing is done.
+
+        Parameters
+        ----------
+        device:
+            The device driver instance that produced the metrics.
+
+        Returns
+        -------
+        The batch instance, for chaining.
+        """
+        device_tags_id = series_registry.intern_tags(device.tags)
+        if self.series_ids is not None and self.device_tags_id == device_tags_id:
+            return self
+
+        intern_series = series_registry.intern_series
+        self.device_tags_id = device_tags_id
+        self.series_ids = array(
+            "l",
+            (
+                intern_series(device_tags_id, name, tags_id)
+                for name, tags_id in zip(self.names, self.tagset_ids)
+            ),
+        )
+        return self
+
+    def extend(self, other: "MetricBatch"):
+        """
+        Append the samples of another bound batch; used by the exporters to
+        combine the batches of many devices.  The combined batch is not bound to
+        a single device, but retains the series id of each sample.
+        """
+        if self.series_ids is None:
+            self.series_ids = array("l")
+
+        self.names.extend(other.names)
+        self.values.extend(other.values)
+        self.timestamps.extend(other.timestamps)
+        self.tagset_ids.extend(other.tagset_ids)
+        self.series_ids.extend(other.series_ids)
+        self.device_tags_id = None
+
+    def compress(self, selectors: Iterable[bool]) -> "MetricBatch":
+        """
+        returns a new batch of the samples whose selector is true, in the same
+        order and with the same binding.
+        """
+        selectors = list(selectors)
+        batch = MetricBatch()
+        batch.names = list(compress(self.names, selectors))
+        batch.values = list(compress(self.values, selectors))
+        batch.timestamps = array("q", compress(self.timestamps, selectors))
+        batch.tagset_ids = array("l", compress(self.tagset_ids, selectors))
+        if self.series_ids is not None:
+            batch.series_ids = array("l", compress(self.series_ids, selectors))
+        batch.device_tags_id = self.device_tags_id
+        return batch
+
+    def samples(self):
+        """ yields tuples of (series_id, value, ts); the batch must be bound """
+        return zip(self.series_ids, self.values, self.timestamps)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __bool__(self):
+        return bool(self.values)
+
+    def __iter__(self):
+        """ yields tuples of (name, value, ts, tags) """
+        tags = series_registry.tags
+        for name, value, ts, tags_id in zip(
+            self.names, self.values, self.timestamps, self.tagset_ids
+        ):
+            yield name, value, ts, tags(tags_id)
@@ -12,18 +12,25 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from typing import Optional, List, Type, TYPE_CHECKING
+from typing import Optional, Callable, Dict, List, Type, TYPE_CHECKING
+from collections import defaultdict
 import asyncio
 import functools
+import time
 
 
-from first import first
 from pydantic import PositiveInt
 
 from nwkatk.config_model import NoExtraBaseModel
-from nwkatk_netmon import Metric
+from nwkatk_netmon import Metric, MetricBatch
 from nwkatk_netmon.log import log
+from nwkatk_netmon.drivers import DriverBase
 from nwkatk_netmon.exporters import ExporterBase
+from nwkatk_netmon.scheduler import TickScheduler, ScheduledJob
+from nwkatk_netmon.limiter import PollLimiter
+from nwkatk_netmon.instrumentation import PipelineMonitor, poll_phases
+from nwkatk_netmon.health import DeviceCircuit
+from nwkatk_netmon.series import series_registry
 
 if TYPE_CHECKING:
     from nwkatk_netmon.config_model import ConfigModel
@@ -104,63 +111,349 @@ class CollectorType(metaclass=CollectorTypeMeta):
 
 
 class CollectorExecutor(object):
+    """
+    The CollectorExecutor runs the collector coroutines on a periodic basis and
+    submits the collected metrics to each of the configured exporters.  The
+    collections are fired by the TickScheduler on absolute, aligned, ticks; see
+    nwkatk_netmon.scheduler.
+    Each collection holds a device request slot from the PollLimiter so that
+    the number of in-flight device requests is bounded.  Unless disabled, the
+    PipelineMonitor adds the netmon_ self-instrumentation metrics; see
+    nwkatk_netmon.instrumentation.
+    The series that are no longer collected are released every series_ttl
+    seconds, or twice the longest job interval if longer; see
+    nwkatk_netmon.series.
+    Each device has a DeviceCircuit; when the circuit opens the device jobs are
+    paused until the device login succeeds again, and a probe poll of one job
+    succeeds, see nwkatk_netmon.health.
+    Each collection, including the wait for a device request slot, must
+    complete within the poll deadline, a fraction of the interval, or it is
+    cancelled; and as the scheduler does not overlap the runs of a job, there
+    is at most one collection in flight per device and collector.  Once the
+    device request slot is held, the collection is also bounded by the device
+    adaptive timeout, and the job is started ahead of its tick by the device
+    latency; see DriverBase.
+    """
+
     def __init__(self, config):
         self.config: ConfigModel = config
-        exporter_name = first(self.config.defaults.exporters) or first(
-            self.config.exporters.keys()
-        )
-        self.exporter: ExporterBase = self.config.exporters[exporter_name]
-
-    def start(self, coro, interval, device, **kwargs):
-        ic = self.interval_executor(interval)(coro)
-        task = ic(device, **kwargs)
-        asyncio.create_task(task)
-
-    def interval_executor(self, interval):
+        exporters = self.config.exporters
+        self.exporters: List[ExporterBase] = [
+            exporters[e_name] for e_name in self.config.defaults.exporters or exporters
+        ]
+        self.scheduler = TickScheduler()
+        self.limiter = PollLimiter(config.defaults.concurrency)
+        self._stats_job: Optional[ScheduledJob] = None
+        self._last_sweep = time.monotonic()
+        self.monitor: Optional[PipelineMonitor] = None
+        self.circuits: Dict[str, DeviceCircuit] = dict()
+        self._device_jobs: Dict[str, List[ScheduledJob]] = defaultdict(list)
+
+        if config.defaults.self_metrics:
+            self.monitor = PipelineMonitor(
+                self.scheduler, self.exporters, circuits=self.circuits
+            )
+
+    def circuit(self, device: DriverBase) -> DeviceCircuit:
+        """ returns the device circuit, creating it if need be """
+        if not (circuit := self.circuits.get(device.name)):
+            circuit = DeviceCircuit(device.name, config=self.config.defaults.health)
+            self.circuits[device.name] = circuit
+
+        return circuit
+
+    async def login(self, device: DriverBase):
+        """
+        Login to the device, retrying with the device circuit backoff until the
+        login succeeds.
         """
-        This decorator should be used on all interval based collector coroutines
-        so that the coroutine is scheduled on the loop on a interval-periodic
-        basis.
+        circuit = self.circuit(device)
+
+        while not await self._login(device):
+            circuit.trip()
+            log.error(
+                f"{device.name}: failed to login, retrying in up to "
+                f"{circuit.backoff:.0f}s"
+            )
+            await circuit.wait_retry()
+
+        circuit.half_open()
+
+    async def _login(self, device: DriverBase) -> bool:
+        try:
+            async with self.limiter.login(device):
+                return await device.login(creds=self.config.defaults.credentials)
+
+        except Exception as exc:  # noqa
+            log.error(f"{device.name}: login failed: {exc.__class__.__name__}")
+            return False
+
+    def start(
+        self,
+        coro,
+        interval,
+        device,
+        adaptive: Optional[Callable[[MetricBatch], float]] = None,
+        **kwargs,
+    ) -> ScheduledJob:
+        """
+        Start the collector coroutine so that it is executed every interval
+        seconds.
 
         Examples
         --------
-        When using this decorator you MUST call it, that is with the parenthesis, as shown:
+        A collector start function registers the collector coroutine, which
+        returns the collected metrics, as shown:
 
-            @interval_collector()
-            async def my_collector(device, interval, **kwargs):
+            async def my_collector(device, **kwargs):
                 # does the actual work of the collector
 
+            executor.start(my_collector, interval=60, device=device, config=config)
+
+        Parameters
+        ----------
+        coro:
+            The collector coroutine function, called with the device and the
+            kwargs on each tick.
+
+        interval:
+            The collection interval in seconds.
+
+        device:
+            The device driver instance
+
+        adaptive:
+            Optional, the function called with the metrics of each successful
+            collection that returns the next collection interval in seconds;
+            the job is rescheduled when the interval changes.
+
+        Returns
+        -------
+        The scheduled job instance.
         """
 
-        def decorate(coro):
-            @functools.wraps(coro)
-            async def wrapped(device, **kwargs):
+        collector_name = f"{coro.__module__}.{coro.__name__}"
+        circuit = self.circuit(device)
+        deadline_ratio = self.config.defaults.poll_deadline
 
-                # await the original collector coroutine to return the collected
-                # metrics.
+        async def collect():
+            # the circuit opened while this tick was already due.
 
-                try:
-                    metrics = await coro(device=device, **kwargs)
+            if circuit.is_open:
+                return
 
-                except Exception as exc:  # noqa
-                    log.critical(
-                        f"{device.name}: collector execution failed: {str(exc)}"
-                    )
+            # await the original collector coroutine to return the collected
+            # metrics.  The collectors record their parse and build phases in
+            # the poll phases context.
+
+            phases = dict()
+            poll_phases.set(phases)
+            metrics, failed, latency = None, False, 0.0
+
+            # the device timeout is at most the poll deadline.
+
+            deadline = job.interval * deadline_ratio
+            if (timeout := device.timeout) is not None:
+                timeout = min(timeout, deadline)
 
-                else:
-                    if metrics:
-                        asyncio.create_task(
-                            self.exporter.export_metrics(device=device, metrics=metrics)
+            async def poll():
+                nonlocal latency
+                async with self.limiter.poll(device):
+                    start = time.perf_counter()
+                    try:
+                        return await asyncio.wait_for(
+                            coro(device=device, **kwargs), timeout=timeout
                         )
+                    finally:
+                        latency = time.perf_counter() - start
 
-                # sleep for an interval of time and then create a new task to
-                # invoke the wrapped coroutine so that we get the effect of a
-                # periodic invocation.
+            started = time.perf_counter()
+            try:
+                metrics = await asyncio.wait_for(poll(), timeout=deadline)
 
-                log.debug(f"{device.name}: Waiting {interval}s before next collection")
-                await asyncio.sleep(interval)
-                asyncio.create_task(wrapped(device=device, **kwargs))
+            except asyncio.TimeoutError:
+                log.error(
+                    f"{device.name}: {collector_name} timed out after "
+                    f"{time.perf_counter() - started:.1f}s, cancelled"
+                )
+                self.scheduler.count_timeout(job)
+
+                # a poll that timed out waiting for a device request slot does
+                # not count against the device.
+
+                if latency:
+                    device.record_timeout()
+                    failed = True
+
+            except Exception as exc:  # noqa
+                log.critical(f"{device.name}: collector execution failed: {str(exc)}")
+                failed = True
+
+            if failed:
+                if circuit.record_failure():
+                    self._open_circuit(device, circuit)
+
+            elif latency:
+                device.record_latency(latency)
+                job.lead = device.lead
+                probed = circuit.state == DeviceCircuit.HALF_OPEN
+                circuit.record_success()
+                if probed:
+                    self._close_circuit(device, probe=job)
+
+            if metrics and not isinstance(metrics, MetricBatch):
+                metrics = MetricBatch.from_metrics(metrics)
+
+            if adaptive and not failed and metrics:
+                if (next_interval := adaptive(metrics)) != job.interval:
+                    log.debug(
+                        f"{job.name}: interval changed from {job.interval}s "
+                        f"to {next_interval}s"
+                    )
+                    self.scheduler.reschedule(job, next_interval)
+
+            if self.monitor:
+                metrics = self.monitor.add_poll_metrics(
+                    metrics,
+                    collector=collector_name,
+                    latency=latency,
+                    queue_wait=self.limiter.queue_wait.get(device.name, 0.0),
+                    phases=phases,
+                    failed=failed,
+                )
+
+            if metrics:
+                await self.submit(device, metrics)
+
+        if not self._stats_job:
+            self._stats_job = self.scheduler.add_job(
+                name="netmon:exporter-stats",
+                interval=self.config.defaults.interval,
+                coro=self.report_exporter_stats,
+            )
+            self.scheduler.add_job(
+                name="netmon:series-sweep",
+                interval=self.config.defaults.series_ttl,
+                coro=self.sweep_series,
+            )
+            if self.monitor:
+                self.monitor.start()
+
+        job_name = f"{device.name}:{collector_name}"
+        job = self.scheduler.add_job(name=job_name, interval=interval, coro=collect)
+        self._device_jobs[device.name].append(job)
+        return job
+
+    def _open_circuit(self, device: DriverBase, circuit: DeviceCircuit):
+        log.warning(
+            f"{device.name}: {circuit.failures} consecutive failed polls, "
+            f"pausing collectors"
+        )
+        for job in self._device_jobs[device.name]:
+            job.cancel()
+
+        asyncio.create_task(self._recover(device, circuit))
+
+    async def _recover(self, device: DriverBase, circuit: DeviceCircuit):
+        """
+        re-login to the device, with backoff, and then resume one of its jobs
+        as the half-open probe; the other jobs are resumed once the probe poll
+        succeeds, see `_close_circuit`.
+        """
+        await circuit.wait_retry()
+        await self.login(device)
 
-            return wrapped
+        probe = self._device_jobs[device.name][0]
+        log.info(f"{device.name}: login succeeded, probing with {probe.name}")
+        self.scheduler.resume(probe)
+
+    def _close_circuit(self, device: DriverBase, probe: ScheduledJob):
+        """ the probe poll succeeded, resume the other device jobs """
+        jobs = self._device_jobs[device.name]
+        if not (paused := [job for job in jobs if job.cancelled]):
+            return
+
+        log.info(f"{device.name}: {probe.name} succeeded, resuming collectors")
+        for job in paused:
+            self.scheduler.resume(job)
+
+    async def start_exporters(self):
+        """ start the exporters, for example the pull exporter servers """
+        for exporter in self.exporters:
+            await exporter.start()
+
+    async def report_exporter_stats(self):
+        """
+        log the export queue depth and counters for each exporter, and export
+        the netmon_ process metrics.
+        """
+        for exporter in self.exporters:
+            batcher = exporter.batcher
+            stats = ", ".join(f"{key}={value}" for key, value in exporter.stats.items())
+            log.info(
+                f"{exporter.name}: export queue depth "
+                f"{batcher.queue_depth}/{batcher.queue_size}, {stats}"
+            )
+
+        if not self.monitor:
+            return
+
+        await self.submit(self.monitor.host, self.monitor.process_metrics())
+
+    async def submit(self, device: DriverBase, metrics: MetricBatch):
+        """
+        Submit the device metrics to all of the exporters concurrently, so that
+        an exporter that blocks, see the "block" queue policy, does not hold up
+        the other exporters.
+        """
+        await asyncio.gather(
+            *(
+                exporter.submit(device=device, metrics=metrics)
+                for exporter in self.exporters
+            )
+        )
+
+    async def sweep_series(self):
+        """ release the series that are no longer collected """
+
+        # a series is only seen once per job interval, and so the time between
+        # the sweeps is at least twice the longest job interval; the interval
+        # of a job can change, see the adaptive interval of `start`.
+
+        jobs = self._device_jobs.values()
+        intervals = (job.interval for device_jobs in jobs for job in device_jobs)
+        period = max(self.config.defaults.series_ttl, 2 * max(intervals, default=0))
+
+        # allow for the jitter of the sweep job ticks.
+
+        if (now := time.monotonic()) - self._last_sweep < period - 1.0:
+            return
+
+        self._last_sweep = now
+        if released := series_registry.sweep():
+            log.info(f"Released {released} series no longer collected")
+
+    async def drain(self, timeout: float):
+        """
+        Export the pending and queued batches of the exporters, waiting at most
+        timeout seconds, and then shutdown.
+        """
+        log.info("Draining exporters")
+        try:
+            closing = [exporter.batcher.close() for exporter in self.exporters]
+            await asyncio.wait_for(asyncio.gather(*closing), timeout=timeout)
+        except asyncio.TimeoutError:
+            log.warning("Timeout draining exporters")
+
+        self.shutdown()
+
+    def shutdown(self):
+        """
+        Stop the exporters, writing the unsent metrics to the exporter spools,
+        and then stop the event loop.
+        """
+        log.info("Shutting down")
+        for exporter in self.exporters:
+            exporter.batcher.stop()
 
-        return decorate
+        asyncio.get_event_loop().stop()
@@ -17,12 +17,13 @@ This file contains the Interface Digital Optical Measurement (DOM) collection
 definition.
 
 """
-from typing import Optional
+from typing import Optional, Dict, Tuple
 from pydantic.dataclasses import dataclass
-from pydantic import conint, Field
+from pydantic import conint, confloat, PositiveInt, Field
 
-from nwkatk_netmon import Metric
+from nwkatk_netmon import Metric, MetricBatch, metric_schema
 from nwkatk_netmon.collectors import CollectorType, CollectorConfigModel
+from nwkatk_netmon.log import log
 
 # -----------------------------------------------------------------------------
 #
@@ -40,6 +41,32 @@ class IFdomCollectorConfig(CollectorConfigModel):
 Controls whether or not to report on interfaces when the link is down.  When
 False (default), only interfaces that are link-up are included.  When True, all
 interfaces with optics installed will be included, even if they are link-down.
+""",
+    )
+    interval_fast: Optional[PositiveInt] = Field(
+        description="""
+Enables the adaptive interval.  The device is polled at this interval while any
+interface DOM status is warning or alert, or a DOM value changes by more than
+its `fast_change` between polls.  After each stable poll the interval is
+doubled, up to `interval_slow`.
+""",
+    )
+    interval_slow: Optional[PositiveInt] = Field(
+        description="""
+The longest adaptive interval, when the device DOM values are stable.  Defaults
+to the collector interval.
+""",
+    )
+    fast_change: Dict[str, confloat(gt=0)] = Field(
+        default={
+            "ifdom_rxpower": 1.0,
+            "ifdom_txpower": 1.0,
+            "ifdom_temp": 5.0,
+            "ifdom_voltage": 0.1,
+        },
+        description="""
+The change between polls, by metric name, that is considered fast and so
+selects the fast interval.
 """,
     )
 
@@ -145,3 +172,97 @@ class IFdomCollector(CollectorType):
 # can register their start functions.
 
 register = IFdomCollector.start.register
+
+
+# -----------------------------------------------------------------------------
+#
+#                              Adaptive Interval
+#
+# -----------------------------------------------------------------------------
+
+_STATUS_METRICS = frozenset(
+    metric_schema(metric_cls)[0]
+    for metric_cls in (
+        IFdomRxPowerStatusMetric,
+        IFdomTxPowerStatusMetric,
+        IFdomTempStatusMetric,
+        IFdomVoltageStatusMetric,
+    )
+)
+
+
+class AdaptiveInterval(object):
+    """
+    The AdaptiveInterval selects the poll interval of a device from its DOM
+    metrics: the fast interval while any status is warning or alert, or a value
+    changed fast since the previous poll; otherwise the interval is doubled
+    after each poll, up to the slow interval.  Each device has its own
+    instance, see `adaptive_interval`.
+
+    Parameters
+    ----------
+    device_name:
+        The device name, used for logging.
+
+    config:
+        The collector config, with the interval options.
+    """
+
+    def __init__(self, device_name: str, config: IFdomCollectorConfig):
+        self.device_name = device_name
+        self.fast = min(config.interval_fast, config.interval)
+        self.slow = max(config.interval_slow or config.interval, config.interval)
+        self.fast_change = config.fast_change
+        self.interval = config.interval
+        self._values: Dict[Tuple[str, Tuple], float] = dict()
+
+    def next_interval(self, metrics: MetricBatch) -> int:
+        """ returns the poll interval following the poll of these metrics """
+        if reason := self._unstable(metrics):
+            if self.interval != self.fast:
+                log.info(f"{self.device_name}: {reason}, polling every {self.fast}s")
+            self.interval = self.fast
+        else:
+            self.interval = min(self.interval * 2, self.slow)
+
+        return self.interval
+
+    def _unstable(self, metrics: MetricBatch) -> Optional[str]:
+        """ returns the reason the DOM values are not stable, or None """
+        reason = None
+        prev_values, fast_change = self._values, self.fast_change
+
+        # the values are keyed by the interface tags, rather than the tag-set
+        # id, since the ids are re-used; and only the values of this poll are
+        # kept, so that the values of removed interfaces are dropped.
+
+        values = dict()
+
+        for name, value, _, tags in metrics:
+            if name in _STATUS_METRICS:
+                if value and not reason:
+                    reason = f"{name} is {'warning' if value == 1 else 'alert'}"
+                continue
+
+            if (change := fast_change.get(name)) is None:
+                continue
+
+            prev = prev_values.get(key := (name, tuple(tags.items())))
+            values[key] = value
+
+            if prev is not None and abs(value - prev) > change and not reason:
+                reason = f"{name} changed by {abs(value - prev):.2f}"
+
+        self._values = values
+        return reason
+
+
+def adaptive_interval(device_name: str, config: IFdomCollectorConfig):
+    """
+    returns the `next_interval` function of the device adaptive interval, or
+    None if the adaptive interval is not configured.
+    """
+    if not config.interval_fast:
+        return None
+
+    return AdaptiveInterval(device_name, config).next_interval
@@ -20,16 +20,17 @@ devices.
 # System Imports
 # -----------------------------------------------------------------------------
 
-from typing import Optional, List
+from typing import Optional
 
 # -----------------------------------------------------------------------------
 # Public Imports
 # -----------------------------------------------------------------------------
 
-from nwkatk_netmon import timestamp_now, Metric
+from nwkatk_netmon import timestamp_tick, MetricBatch
 from nwkatk_netmon.collectors import CollectorExecutor
 from nwkatk_netmon.log import log
 from nwkatk_netmon.drivers.eapi import Device
+from nwkatk_netmon.instrumentation import poll_phase
 
 # -----------------------------------------------------------------------------
 # Private Imports
@@ -64,16 +65,20 @@ async def start(
     """
     log.info(f"{device.name}: Starting Arista EOS Interface DOM collection")
     executor.start(
-        get_dom_metrics, interval=config.interval, device=device, config=config
+        get_dom_metrics,
+        interval=config.interval,
+        device=device,
+        adaptive=ifdom.adaptive_interval(device.name, config),
+        config=config,
     )
 
 
 async def get_dom_metrics(
     device: Device, config: ifdom.IFdomCollectorConfig
-) -> Optional[List[Metric]]:
+) -> Optional[MetricBatch]:
     """
     This coroutine will be executed as a asyncio Task on a periodic basis, the
-    purpose is to collect data from the device and return the list of Interface
+    purpose is to collect data from the device and return the batch of Interface
     DOM metrics.
 
     Parameters
@@ -86,7 +91,7 @@ async def get_dom_metrics(
 
     Returns
     -------
-    Option list of Metic items.
+    Optional batch of Metric samples.
     """
     log.debug(f"{device.name}: Getting DOM information")
     # Execute the required "show" commands to colelct the interface information
@@ -132,14 +137,19 @@ async def get_dom_metrics(
         # otherwise only allow interface that are in the link-up condition
         return if_status == "up"
 
-    metrics = [
-        measurement
-        for if_name, if_dom_data in ifs_dom.items()
-        if if_dom_data and __ok_process_if(if_name)
-        for measurement in _make_if_metrics(
-            if_name, if_dom_data, if_desc=ifs_desc[if_name]["description"]
-        )
-    ]
+    metrics = MetricBatch()
+    ts = timestamp_tick()
+
+    with poll_phase("build"):
+        for if_name, if_dom_data in ifs_dom.items():
+            if if_dom_data and __ok_process_if(if_name):
+                _make_if_metrics(
+                    metrics,
+                    if_name,
+                    if_dom_data,
+                    if_desc=ifs_desc[if_name]["description"],
+                    ts=ts,
+                )
 
     return metrics
 
@@ -151,13 +161,29 @@ async def get_dom_metrics(
 # -----------------------------------------------------------------------------
 
 
-def _make_if_metrics(if_name: str, if_dom_data: dict, if_desc: str):
+# maps the EAPI transceiver field to the IFdom value and status Metric types.
+# The same field name is used to find the threshold values in the "details".
+
+_METRIC_FIELD_MAP = (
+    ("txPower", ifdom.IFdomTxPowerMetric, ifdom.IFdomTxPowerStatusMetric),
+    ("rxPower", ifdom.IFdomRxPowerMetric, ifdom.IFdomRxPowerStatusMetric),
+    ("temperature", ifdom.IFdomTempMetric, ifdom.IFdomTempStatusMetric),
+    ("voltage", ifdom.IFdomVoltageMetric, ifdom.IFdomVoltageStatusMetric),
+)
+
+
+def _make_if_metrics(
+    metrics: MetricBatch, if_name: str, if_dom_data: dict, if_desc: str, ts: int
+):
     """
-    This function is used to create the specific IFdom Metrics for a specific
-    interface.
+    This function is used to add the specific IFdom Metrics for a specific
+    interface to the metrics batch.
 
     Parameters
     ----------
+    metrics:
+        The batch that will receive the IFdom metric samples
+
     if_name:
         The interface name
 
@@ -167,52 +193,27 @@ def _make_if_metrics(if_name: str, if_dom_data: dict, if_desc: str):
     if_desc:
         The interface description value
 
-    Yields
-    ------
-    A collection of IFdom specific Metrics.
+    ts:
+        The timestamp for all of the metric samples
     """
-    ts = timestamp_now()
-
-    c_tags = {
-        "if_name": if_name,
-        "if_desc": if_desc or "MISSING-DESCRIPTION",
-        "media": if_dom_data["mediaType"],
-    }
-
-    m_txpow = ifdom.IFdomTxPowerMetric(value=if_dom_data["txPower"], tags=c_tags, ts=ts)
-    m_rxpow = ifdom.IFdomRxPowerMetric(value=if_dom_data["rxPower"], tags=c_tags, ts=ts)
-    m_temp = ifdom.IFdomTempMetric(value=if_dom_data["temperature"], tags=c_tags, ts=ts)
-    m_volt = ifdom.IFdomVoltageMetric(value=if_dom_data["voltage"], tags=c_tags, ts=ts)
-
-    yield from [m_txpow, m_rxpow, m_temp, m_volt]
-
-    thresholds = if_dom_data["details"]
-
-    yield ifdom.IFdomRxPowerStatusMetric(
-        value=_threshold_outside(value=m_rxpow.value, thresholds=thresholds["rxPower"]),
-        tags=c_tags,
-        ts=ts,
+    tags_id = metrics.add_tags(
+        {
+            "if_name": if_name,
+            "if_desc": if_desc or "MISSING-DESCRIPTION",
+            "media": if_dom_data["mediaType"],
+        }
     )
 
-    yield ifdom.IFdomTxPowerStatusMetric(
-        value=_threshold_outside(value=m_txpow.value, thresholds=thresholds["txPower"]),
-        tags=c_tags,
-        ts=ts,
-    )
+    thresholds = if_dom_data["details"]
 
-    yield ifdom.IFdomTempStatusMetric(
-        value=_threshold_outside(
-            value=m_temp.value, thresholds=thresholds["temperature"]
-        ),
-        tags=c_tags,
-        ts=ts,
-    )
+    for field, value_cls, _ in _METRIC_FIELD_MAP:
+        metrics.append(value_cls, if_dom_data[field], tags_id=tags_id, ts=ts)
 
-    yield ifdom.IFdomVoltageStatusMetric(
-        value=_threshold_outside(value=m_volt.value, thresholds=thresholds["voltage"]),
-        tags=c_tags,
-        ts=ts,
-    )
+    for field, _, status_cls in _METRIC_FIELD_MAP:
+        status = _threshold_outside(
+            value=if_dom_data[field], thresholds=thresholds[field]
+        )
+        metrics.append(status_cls, status, tags_id=tags_id, ts=ts)
 
 
 def _threshold_outside(value: float, thresholds: dict) -> int:
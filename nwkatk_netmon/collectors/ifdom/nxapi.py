@@ -21,19 +21,20 @@ Device: Cisco NX-OS via NXAPI
 # System Imports
 # -----------------------------------------------------------------------------
 
-from typing import Optional, List
+from typing import Optional, Dict
 from functools import lru_cache
 
 # -----------------------------------------------------------------------------
 # Public Imports
 # -----------------------------------------------------------------------------
 
-from lxml.etree import Element
+from lxml.etree import Element, XPath
 
 from nwkatk_netmon.log import log
-from nwkatk_netmon import Metric, timestamp_now
+from nwkatk_netmon import MetricBatch, timestamp_tick
 from nwkatk_netmon.collectors import CollectorExecutor
 from nwkatk_netmon.drivers.nxapi import Device
+from nwkatk_netmon.instrumentation import poll_phase
 
 # -----------------------------------------------------------------------------
 # Private Imports
@@ -75,16 +76,20 @@ async def start(device: Device, executor: CollectorExecutor, config):
     """
     log.info(f"{device.name}: Starting Cisco NXAPI Interface DOM collection")
     executor.start(
-        get_dom_metrics, interval=config.interval, device=device, config=config
+        get_dom_metrics,
+        interval=config.interval,
+        device=device,
+        adaptive=ifdom.adaptive_interval(device.name, config),
+        config=config,
     )
 
 
 async def get_dom_metrics(
     device: Device, config: ifdom.IFdomCollectorConfig
-) -> Optional[List[Metric]]:
+) -> Optional[MetricBatch]:
     """
     This coroutine will be executed as a asyncio Task on a periodic basis, the
-    purpose is to collect data from the device and return the list of Interface
+    purpose is to collect data from the device and return the batch of Interface
     DOM metrics.
 
     Parameters
@@ -97,25 +102,19 @@ async def get_dom_metrics(
 
     Returns
     -------
-    Option list of Metic items.
+    Optional batch of Metric samples.
     """
-    timestamp = timestamp_now()
+    timestamp = timestamp_tick()
 
     log.info(f"{device.name}: Process DOM metrics ts={timestamp}")
 
-    ifs_dom_res, ifs_status_res = await device.nxapi.exec(
-        ["show interface transceiver details", "show interface status"]
-    )
+    (ifs_status_res,) = await device.nxapi.exec(["show interface status"])
 
-    # find all interfaces that have a transceiver present, and the transceiver
-    # has a temperature value - guard against non-optical transceivers.
+    # index the interface status table by interface name once per poll, rather
+    # than searching the table for each interface.
 
-    ifs_dom_data = [
-        _row_to_dict(ele)
-        for ele in ifs_dom_res.output.xpath(
-            './/ROW_interface[sfp="present" and temperature]'
-        )
-    ]
+    with poll_phase("parse"):
+        ifs_status = _index_ifs_status(ifs_status_res.output)
 
     def _allow_interface(if_status):
         if if_status == "disabled":
@@ -129,51 +128,56 @@ async def get_dom_metrics(
 
         return if_status == "connected"
 
-    # noinspection PyArgumentList
-    def generate_metrics():
+    metrics = MetricBatch()
+
+    # the transceiver details output is large on chassis devices, and so the
+    # rows are parsed as they are received and freed once processed.
+
+    ifs_dom_rows = device.stream_rows(
+        "show interface transceiver details", tag="ROW_interface"
+    )
+
+    async for ifs_dom_row in ifs_dom_rows:
+        with poll_phase("parse"):
+            if_dom_item = _row_to_dict(ifs_dom_row)
+
+        # only interfaces that have a transceiver present, and the transceiver
+        # has a temperature value - guard against non-optical transceivers.
 
-        for if_dom_item in ifs_dom_data:
-            if_name = if_dom_item["interface"]
+        if if_dom_item.get("sfp") != "present" or "temperature" not in if_dom_item:
+            continue
 
-            # for the given interface, if it not in a connected state (up), then do not report
+        if_name = if_dom_item["interface"]
 
-            # if_status = ifs_status_res.output.xpath(
-            #     f'TABLE_interface/ROW_interface[interface="{if_name}" and state!="disabled"]'
-            # )
+        # for the given interface, if it not in a connected state (up), then do not report
 
-            if_status = ifs_status_res.output.xpath(
-                f'TABLE_interface/ROW_interface[interface="{if_name}"]'
-            )[0]
+        if (if_status := ifs_status.get(if_name)) is None:
+            continue
 
-            if not _allow_interface(if_status.findtext("state")):
-                continue
+        if not _allow_interface(if_status.findtext("state")):
+            continue
 
-            # obtain the interface description value; handle case if there is none configured.
+        # obtain the interface description value; handle case if there is none configured.
 
-            if_desc = (if_status.findtext("name") or "").strip()
-            if_media = (if_dom_item["type"] or if_dom_item["partnum"]).strip()
+        if_desc = (if_status.findtext("name") or "").strip()
+        if_media = (if_dom_item["type"] or if_dom_item["partnum"]).strip()
 
-            # all of the metrics will share the same interface tags
+        # all of the metrics will share the same interface tags
 
-            if_tags = {
-                "if_name": if_name,
-                "if_desc": if_desc,
-                "media": if_media,
-            }
+        with poll_phase("build"):
+            _make_if_metrics(
+                metrics,
+                if_dom_item,
+                tags={"if_name": if_name, "if_desc": if_desc, "media": if_media},
+                ts=timestamp,
+            )
 
-            for nx_field, metric_cls in _METRIC_VALUE_MAP.items():
-                if metric_value := if_dom_item.get(nx_field):
-                    yield metric_cls(value=metric_value, tags=if_tags, ts=timestamp)
+    return metrics
 
-            for nx_field, metric_cls in _METRIC_STATUS_MAP.items():
-                if metric_value := if_dom_item.get(nx_field):
-                    yield metric_cls(
-                        value=_from_flag_to_status(metric_value),
-                        tags=if_tags,
-                        ts=timestamp,
-                    )
 
-    return list(generate_metrics())
+# precompiled XPath expression used to find the interface status table rows.
+
+_xpath_ifs_status = XPath("TABLE_interface/ROW_interface")
 
 
 _METRIC_VALUE_MAP = {
@@ -208,6 +212,28 @@ def _from_flag_to_status(flag: str) -> int:
     return {"++": 2, "--": 2, "+": 1, "-": 1}.get(flag.strip(), 0)
 
 
+def _make_if_metrics(metrics: MetricBatch, if_dom_item: dict, tags: dict, ts: int):
+    """ add the IFdom metrics for the interface transceiver to the metrics batch """
+    tags_id = metrics.add_tags(tags)
+
+    for nx_field, metric_cls in _METRIC_VALUE_MAP.items():
+        if metric_value := if_dom_item.get(nx_field):
+            metrics.append(metric_cls, metric_value, tags_id=tags_id, ts=ts)
+
+    for nx_field, metric_cls in _METRIC_STATUS_MAP.items():
+        if metric_value := if_dom_item.get(nx_field):
+            metrics.append(
+                metric_cls, _from_flag_to_status(metric_value), tags_id=tags_id, ts=ts
+            )
+
+
 def _row_to_dict(row: Element):
     """ helper function to convert XML elements into a dict obj. """
     return {ele.tag: ele.text for ele in row.iterchildren()}
+
+
+def _index_ifs_status(ifs_status: Element) -> Dict[str, Element]:
+    """
+    helper function to index the "show interface status" rows by interface name.
+    """
+    return {row.findtext("interface"): row for row in _xpath_ifs_status(ifs_status)}
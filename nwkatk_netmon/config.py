@@ -21,6 +21,7 @@ from .config_model import ConfigModel, ValidationError
 
 
 _config = ContextVar("config")
+_config_data = ContextVar("config_data")
 
 
 def load_config_file(ctx, param, value):  # noqa
@@ -35,9 +36,18 @@ def load_config_file(ctx, param, value):  # noqa
         )
 
     _config.set(config_obj)
+    _config_data.set(config_data)
     return config_obj
 
 
+def get_config_data() -> dict:
+    """
+    returns the config file data, used to re-create the config model in the
+    worker processes.
+    """
+    return _config_data.get()
+
+
 # @lru_cache
 # def get_config():
 #     return _config.get()
@@ -30,6 +30,8 @@ from pydantic import (
     BaseSettings,
     Field,
     PositiveInt,
+    conint,
+    confloat,
     validator,
     root_validator,
 )
@@ -55,6 +57,10 @@ from nwkatk.config_model import (
 from nwkatk_netmon.collectors import CollectorType, CollectorConfigModel
 from nwkatk_netmon.drivers import DriverBase
 from nwkatk_netmon.exporters import ExporterBase
+from nwkatk_netmon.eventloop import LoopModel
+from nwkatk_netmon.drivers.http import HTTPClientModel
+from nwkatk_netmon.drivers.latency import LatencyModel
+from nwkatk_netmon.health import HealthModel
 
 
 class DefaultCredential(Credential, BaseSettings):
@@ -62,11 +68,53 @@ class DefaultCredential(Credential, BaseSettings):
     password: EnvSecretStr
 
 
+class ConcurrencyModel(NoExtraBaseModel):
+    max_inflight: PositiveInt = Field(
+        default=consts.DEFAULT_MAX_INFLIGHT,
+        description="maximum number of in-flight device requests",
+    )
+    max_logins: PositiveInt = Field(
+        default=consts.DEFAULT_MAX_LOGINS,
+        description="maximum number of concurrent device logins",
+    )
+    drivers: Dict[str, PositiveInt] = Field(
+        default={},
+        description="maximum number of in-flight device requests per os_name",
+    )
+
+
+class ShardingModel(NoExtraBaseModel):
+    index: conint(ge=0) = Field(default=0, description="shard of this instance")
+    count: PositiveInt = Field(default=1, description="number of shards")
+
+    @root_validator
+    def _index_in_count(cls, values):
+        index, count = values.get("index"), values.get("count")
+        if index is not None and count and index >= count:
+            raise ValueError(f"index {index} must be less than count {count}")
+        return values
+
+
 class DefaultsModel(NoExtraBaseModel, BaseSettings):
     interval: Optional[PositiveInt] = Field(default=consts.DEFAULT_INTERVAL)
     inventory: FilePathEnvExpand
     credentials: DefaultCredential
     exporters: Optional[List[str]]
+    concurrency: ConcurrencyModel = ConcurrencyModel()
+    sharding: ShardingModel = ShardingModel()
+    loop: LoopModel = LoopModel()
+    http: HTTPClientModel = HTTPClientModel()
+    health: HealthModel = HealthModel()
+    latency: LatencyModel = LatencyModel()
+    poll_deadline: confloat(gt=0, le=1) = Field(
+        default=0.9, description="poll deadline, as a fraction of the interval"
+    )
+    self_metrics: bool = Field(
+        default=True, description="export the netmon_ self-instrumentation metrics"
+    )
+    series_ttl: PositiveInt = Field(
+        default=3600, description="release the series not collected for this long"
+    )
 
 
 class DeviceDriverModel(NoExtraBaseModel):
@@ -142,6 +190,7 @@ class ConfigModel(NoExtraBaseModel):
             e_val.config = e_cfg_model.validate(e_val.config)
             e_inst = e_cls(e_name)
             e_inst.prepare(e_val.config)
+            e_inst.setup_export(e_val.config)
             exporters[e_name] = e_inst
 
         return exporters
@@ -13,3 +13,8 @@
 #     limitations under the License.
 
 DEFAULT_INTERVAL = 60
+
+# the default limits on concurrent device requests and device logins.
+
+DEFAULT_MAX_INFLIGHT = 500
+DEFAULT_MAX_LOGINS = 50
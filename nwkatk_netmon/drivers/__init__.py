@@ -16,22 +16,66 @@ from typing import Optional
 
 from nwkatk.config_model import Credential
 
+from nwkatk_netmon.drivers.http import HTTPClientModel
+from nwkatk_netmon.drivers.latency import LatencyModel, LatencyEstimator
+
 
 class DriverBase(object):
+    """
+    The DriverBase is the base type for defining a device driver.  A driver
+    creates its device HTTP clients in `login`, using the `http_config`
+    options, and closes them in `close`; see nwkatk_netmon.drivers.http.
+
+    The CollectorExecutor records the latency of each device poll, see
+    `record_latency`, from which the driver derives the device poll `timeout`
+    and the poll scheduling `lead`; see nwkatk_netmon.drivers.latency.
+    """
+
     def __init__(self, name):
         self.name = name
         self.device_host = None
+        self.os_name = None
         self.private = None
         self.tags = dict()
         self.creds = None
+        self.http_config = HTTPClientModel()
+        self.latency = LatencyEstimator(LatencyModel())
 
-    def prepare(self, inventory_rec, config):  # noqa
+    def prepare(self, inventory_rec, config):
         self.device_host = inventory_rec.get("ipaddr") or inventory_rec["host"]
+        self.os_name = inventory_rec.get("os_name")
         self.private = inventory_rec.copy()
         self.tags = inventory_rec.copy()
+        self.http_config = config.defaults.http
+        self.latency = LatencyEstimator(config.defaults.latency)
+
+    def record_latency(self, seconds: float):
+        """ record the latency of a successful poll """
+        self.latency.update(seconds)
+
+    def record_timeout(self):
+        """ record a poll that timed out """
+        self.latency.timed_out()
+
+    @property
+    def timeout(self) -> Optional[float]:
+        """ the poll timeout in seconds, None until enough polls are observed """
+        return self.latency.timeout
+
+    @property
+    def lead(self) -> float:
+        """ the time, in seconds, that a poll should start ahead of its tick """
+        return self.latency.lead
 
     async def login(self, creds: Optional[Credential] = None) -> bool:
         raise NotImplementedError()
 
+    async def close(self):
+        """
+        close the device HTTP clients, and their kept-alive connections; called
+        by `login` before the clients are created again.
+        """
+        pass
+
     def __str__(self):
         return self.name
@@ -29,6 +29,7 @@ from asynceapi import Device as DeviceEAPI
 # -----------------------------------------------------------------------------
 
 from nwkatk_netmon.drivers import DriverBase, Credential
+from nwkatk_netmon.drivers.http import http_client_options
 from nwkatk_netmon.log import log
 
 
@@ -42,10 +43,15 @@ class Device(DriverBase):
         self.eapi = None
 
     async def login(self, creds: Optional[Credential] = None) -> bool:
+        # a re-login, after the device circuit opened, replaces the client.
+
+        await self.close()
+
         self.eapi = DeviceEAPI(
             host=self.device_host,
             creds=(creds.username, creds.password.get_secret_value()),
             private=self.private,
+            **http_client_options(self.name, self.http_config),
         )
 
         log.info(f"{self.name}: Connecting to Arista EOS device")
@@ -55,8 +61,14 @@ class Device(DriverBase):
 
         except Exception as exc:
             log.error(f"{self.name} No NXAPI access: {str(exc)}, skipping.")
+            await self.close()
             return False
 
         self.eapi.host = res[0].output["hostname"]
         self.creds = creds
         return True
+
+    async def close(self):
+        if self.eapi:
+            eapi, self.eapi = self.eapi, None
+            await eapi.aclose()
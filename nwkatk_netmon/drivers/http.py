@@ -0,0 +1,156 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the HTTP client options of the device drivers.  Each device
+driver owns a pooled HTTP client whose connections are kept alive between the
+polls, so that a poll does not pay for a new TCP and TLS handshake with the
+device.  The default httpx keep-alive expiry, 5 seconds, is much shorter than
+the poll interval, and so the driver clients use their own connection pool.
+
+A device may close an idle connection at the same moment a request is sent on
+it; the KeepAliveConnectionPool retries such a request once on a new
+connection, so that the collectors do not see the stale connection errors.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Dict
+import ssl
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+import httpx
+import httpcore
+from pydantic import Field, PositiveInt, PositiveFloat
+from nwkatk.config_model import NoExtraBaseModel
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon.log import log
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["HTTPClientModel", "KeepAliveConnectionPool", "http_client_options"]
+
+
+# the errors of a request sent on a connection that the device has closed.
+
+_STALE_CONNECTION_ERRORS = (
+    httpcore.ReadError,
+    httpcore.WriteError,
+    httpcore.RemoteProtocolError,
+)
+
+
+class HTTPClientModel(NoExtraBaseModel):
+    connect_timeout: PositiveFloat = Field(
+        default=10.0, description="seconds to establish a device connection"
+    )
+    read_timeout: PositiveFloat = Field(
+        default=60.0, description="seconds to wait for device response data"
+    )
+    pool_timeout: PositiveFloat = Field(
+        default=30.0, description="seconds to wait for a free pool connection"
+    )
+    max_connections: PositiveInt = Field(
+        default=4, description="maximum number of connections per device"
+    )
+    max_keepalive: PositiveInt = Field(
+        default=2, description="maximum number of idle connections kept per device"
+    )
+    keepalive_expiry: PositiveFloat = Field(
+        default=300.0, description="close the idle connections after this many seconds"
+    )
+    http2: bool = Field(
+        default=False, description="use HTTP/2 when the device supports it"
+    )
+    verify: bool = Field(default=False, description="verify the device certificate")
+
+
+class KeepAliveConnectionPool(httpcore.AsyncConnectionPool):
+    """
+    The connection pool of a device HTTP client, retrying once the requests
+    that fail because the device closed the kept-alive connection.
+
+    Parameters
+    ----------
+    name:
+        The device name, used for logging.
+
+    Other Parameters
+    ----------------
+    The httpcore.AsyncConnectionPool parameters.
+    """
+
+    def __init__(self, name: str, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.reconnects = 0
+
+    async def request(self, method, url, headers=None, stream=None, timeout=None):
+        try:
+            return await super().request(
+                method, url, headers=headers, stream=stream, timeout=timeout
+            )
+
+        except _STALE_CONNECTION_ERRORS as exc:
+            self.reconnects += 1
+            log.debug(
+                f"{self.name}: reconnecting, connection lost: "
+                f"{exc.__class__.__name__}"
+            )
+
+        return await super().request(
+            method, url, headers=headers, stream=stream, timeout=timeout
+        )
+
+
+def _ssl_context(config: HTTPClientModel) -> ssl.SSLContext:
+    ctx = ssl.create_default_context()
+
+    if not config.verify:
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+
+    ctx.set_alpn_protocols(["h2", "http/1.1"] if config.http2 else ["http/1.1"])
+    return ctx
+
+
+def http_client_options(name: str, config: HTTPClientModel) -> Dict:
+    """ returns the httpx.AsyncClient options of the device `name` HTTP client """
+    return dict(
+        timeout=httpx.Timeout(
+            connect_timeout=config.connect_timeout,
+            read_timeout=config.read_timeout,
+            write_timeout=config.read_timeout,
+            pool_timeout=config.pool_timeout,
+        ),
+        transport=KeepAliveConnectionPool(
+            name=name,
+            ssl_context=_ssl_context(config),
+            max_connections=config.max_connections,
+            max_keepalive=config.max_keepalive,
+            keepalive_expiry=config.keepalive_expiry,
+            http2=config.http2,
+        ),
+    )
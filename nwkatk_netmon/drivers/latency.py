@@ -0,0 +1,134 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the per-device latency estimator.  The devices of a fleet
+respond in anything from milliseconds to seconds, and so rather than a single
+static timeout each device driver derives its poll timeout from the observed
+poll latency, in the same way that TCP derives its retransmission timeout
+(RFC 6298): the timeout is the smoothed latency plus a multiple of the smoothed
+latency deviation.  When a poll times out the timeout is doubled until the
+next successful poll; so that a device whose latency grows is not timed out
+forever.  The CollectorExecutor limits the timeout to the poll deadline.
+
+The smoothed latency is also used as the scheduling lead of the device polls,
+see nwkatk_netmon.scheduler, so that a poll completes near its tick time.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Optional
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+from pydantic import Field, PositiveInt, PositiveFloat
+from nwkatk.config_model import NoExtraBaseModel
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["LatencyModel", "LatencyEstimator"]
+
+
+# the RFC 6298 smoothing gains of the latency and of the latency deviation.
+
+_ALPHA = 1 / 8
+_BETA = 1 / 4
+
+# the maximum timeout backoff multiplier.
+
+_MAX_BACKOFF = 64
+
+
+class LatencyModel(NoExtraBaseModel):
+    adaptive_timeout: bool = Field(
+        default=True, description="derive the device poll timeout from its latency"
+    )
+    min_timeout: PositiveFloat = Field(
+        default=5.0, description="minimum adaptive poll timeout in seconds"
+    )
+    deviation_factor: PositiveFloat = Field(
+        default=4.0, description="latency deviations added to the smoothed latency"
+    )
+    min_samples: PositiveInt = Field(
+        default=3, description="polls observed before the timeout is adapted"
+    )
+    schedule_lead: bool = Field(
+        default=True, description="start the device polls ahead of their tick"
+    )
+
+
+class LatencyEstimator(object):
+    """
+    The LatencyEstimator tracks the smoothed latency, and latency deviation, of
+    a device.
+
+    Parameters
+    ----------
+    config:
+        The latency options.
+
+    Attributes
+    ----------
+    srtt: float
+        The smoothed latency in seconds.
+
+    rttvar: float
+        The smoothed latency deviation in seconds.
+
+    samples: int
+        The number of latencies observed.
+    """
+
+    def __init__(self, config: LatencyModel):
+        self.config = config
+        self.srtt = 0.0
+        self.rttvar = 0.0
+        self.samples = 0
+        self._backoff = 1
+
+    def update(self, latency: float):
+        """ update the estimate with the latency, in seconds, of a poll """
+        if not self.samples:
+            self.srtt, self.rttvar = latency, latency / 2
+        else:
+            self.rttvar += _BETA * (abs(self.srtt - latency) - self.rttvar)
+            self.srtt += _ALPHA * (latency - self.srtt)
+
+        self.samples += 1
+        self._backoff = 1
+
+    def timed_out(self):
+        """ a poll timed out, double the timeout until the next latency update """
+        self._backoff = min(self._backoff * 2, _MAX_BACKOFF)
+
+    @property
+    def timeout(self) -> Optional[float]:
+        """ returns the poll timeout in seconds, or None if it is not adapted """
+        config = self.config
+        if not config.adaptive_timeout or self.samples < config.min_samples:
+            return None
+
+        timeout = self.srtt + config.deviation_factor * self.rttvar
+        return max(timeout, config.min_timeout) * self._backoff
+
+    @property
+    def lead(self) -> float:
+        """ returns the scheduling lead in seconds """
+        return self.srtt if self.config.schedule_lead else 0.0
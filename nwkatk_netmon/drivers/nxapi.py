@@ -16,12 +16,14 @@
 # System Imports
 # -----------------------------------------------------------------------------
 
-from typing import Optional
+from typing import Optional, AsyncIterator
 
 # -----------------------------------------------------------------------------
 # Public Imports
 # -----------------------------------------------------------------------------
 
+import httpx
+from lxml import etree
 from asyncnxapi import Device as DeviceNXAPI
 
 # -----------------------------------------------------------------------------
@@ -29,9 +31,22 @@ from asyncnxapi import Device as DeviceNXAPI
 # -----------------------------------------------------------------------------
 
 from nwkatk_netmon.drivers import DriverBase, Credential
+from nwkatk_netmon.drivers.http import http_client_options
 from nwkatk_netmon.log import log
 
 
+_NXAPI_XML_REQUEST = """<?xml version="1.0"?>
+<ins_api>
+  <version>1.0</version>
+  <type>cli_show</type>
+  <chunk>0</chunk>
+  <sid>sid</sid>
+  <input>{command}</input>
+  <output_format>xml</output_format>
+</ins_api>
+"""
+
+
 class Device(DriverBase):
     """
     Network Automation Netmon DriverBase for Cisco NXAPI devices.
@@ -40,11 +55,17 @@ class Device(DriverBase):
     def __init__(self, name: str):
         super().__init__(name)
         self.nxapi = None
+        self.httpx = None
 
     async def login(self, creds: Optional[Credential] = None) -> bool:
+        # a re-login, after the device circuit opened, replaces the clients.
+
+        await self.close()
+
         self.nxapi = DeviceNXAPI(
             host=self.device_host,
             creds=(creds.username, creds.password.get_secret_value()),
+            **http_client_options(self.name, self.http_config),
         )
 
         log.info(f"{self.name}: Connecting to NX-OS device")
@@ -55,8 +76,79 @@ class Device(DriverBase):
         except Exception as exc:
             emsg = f"{self.name} No EAPI access: {str(exc)}, skipping."
             log.error(emsg)
+            await self.close()
             return False
 
         self.nxapi.host = res[0].output.findtext("hostname")
         self.creds = creds
+
+        # the client used to stream large command outputs, see `stream_rows`;
+        # with its own connection pool so that a stream does not hold up the
+        # other commands.
+
+        self.httpx = httpx.AsyncClient(
+            base_url=f"https://{self.device_host}",
+            auth=(creds.username, creds.password.get_secret_value()),
+            headers={"content-type": "application/xml"},
+            **http_client_options(self.name, self.http_config),
+        )
         return True
+
+    async def close(self):
+        for client in (self.nxapi, self.httpx):
+            if client:
+                await client.aclose()
+
+        self.nxapi = self.httpx = None
+
+    async def stream_rows(self, command: str, tag: str) -> AsyncIterator[etree.Element]:
+        """
+        Execute the show command and incrementally parse the XML response as it
+        is received, yielding each table row element as soon as it is complete.
+        The row element is freed when the next row is requested, and so the
+        caller must extract the data it needs before then.  This keeps the memory
+        used bounded regardless of the size of the command output.
+
+        Parameters
+        ----------
+        command:
+            The show command, for example "show interface transceiver details"
+
+        tag:
+            The row element tag, for example "ROW_interface"
+
+        Raises
+        ------
+        RuntimeError
+            When the device reports that the command failed.
+        """
+        parser = etree.XMLPullParser(events=("end",), tag=(tag, "code", "msg"))
+        request = _NXAPI_XML_REQUEST.format(command=command)
+        status = dict()
+
+        async with self.httpx.stream("POST", "/ins", data=request) as res:
+            res.raise_for_status()
+
+            async for chunk in res.aiter_bytes():
+                parser.feed(chunk)
+
+                for _, ele in parser.read_events():
+                    if ele.tag != tag:
+                        status[ele.tag] = ele.text
+                        continue
+
+                    yield ele
+
+                    # free the row, and any preceding rows, now that the caller
+                    # is done with it.
+
+                    ele.clear()
+                    while ele.getprevious() is not None:
+                        del ele.getparent()[0]
+
+        parser.close()
+
+        if status.get("code", "200") != "200":
+            raise RuntimeError(
+                f"{self.name}: command '{command}' failed: {status.get('msg')}"
+            )
@@ -0,0 +1,102 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the creation of the event loop that runs the collectors
+and exporters.  The loop is either the standard asyncio loop or, when the
+optional uvloop package is installed, the uvloop loop; see the "uvloop" extra.
+The loop default executor, used for the spool I/O and payload compression,
+can be sized, and the asyncio debug mode can be enabled to log the callbacks
+that block the loop for longer than a threshold.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Optional, Literal
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+from pydantic import Field, PositiveInt, PositiveFloat
+from nwkatk.config_model import NoExtraBaseModel
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon.log import log
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["LoopModel", "LoopType", "new_event_loop"]
+
+
+LoopType = Literal["asyncio", "uvloop"]
+
+
+class LoopModel(NoExtraBaseModel):
+    type: LoopType = Field(
+        default="asyncio", description="event loop, uvloop requires the uvloop extra"
+    )
+    executor_workers: Optional[PositiveInt] = Field(
+        description="number of threads of the loop default executor"
+    )
+    slow_callback_duration: Optional[PositiveFloat] = Field(
+        description="enable the loop debug mode, logging callbacks slower than this"
+    )
+
+
+def new_event_loop(config: LoopModel, loop_type: Optional[LoopType] = None):
+    """
+    Create the event loop, according to the loop config, and set it as the
+    current event loop.  The `loop_type`, when provided, overrides the config
+    loop type.  If uvloop is not installed the asyncio loop is used.
+
+    Returns
+    -------
+    The new event loop.
+    """
+    loop_type = loop_type or config.type
+
+    if loop_type == "uvloop":
+        try:
+            import uvloop
+
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+        except ImportError:
+            log.warning("uvloop is not installed, using the asyncio event loop")
+            loop_type = "asyncio"
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    if config.executor_workers:
+        loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=config.executor_workers)
+        )
+
+    if config.slow_callback_duration:
+        loop.set_debug(True)
+        loop.slow_callback_duration = config.slow_callback_duration
+
+    log.info(f"Using the {loop_type} event loop")
+    return loop
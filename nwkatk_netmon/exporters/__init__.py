@@ -12,14 +12,128 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from typing import Optional, List
-from nwkatk.config_model import BaseModel
+from typing import Optional, Iterable, Literal, List, Dict, TYPE_CHECKING
+from collections import Counter
+from pathlib import Path
+
+from pydantic import Field, PositiveInt, PositiveFloat, conint, confloat
+from nwkatk.config_model import BaseModel, NoExtraBaseModel, EnvExpand
 
 from nwkatk_netmon.drivers import DriverBase
-from nwkatk_netmon import Metric
+from nwkatk_netmon import Metric, MetricBatch
+from nwkatk_netmon.log import log
+from nwkatk_netmon.exporters.batching import ExportBatcher
+from nwkatk_netmon.exporters.spool import Spool, PayloadRejected
+from nwkatk_netmon.exporters.compression import PayloadCompressor
+from nwkatk_netmon.exporters.suppression import DeltaSuppressor
+
+if TYPE_CHECKING:
+    from nwkatk_netmon.workers import PayloadForwarder
+
+
+def retryable(exc: BaseException) -> bool:
+    """ the tenacity retry predicate of `send_payload`, rejections are not retried """
+    return not isinstance(exc, PayloadRejected)
+
+
+class ExporterConfigModel(NoExtraBaseModel):
+    """
+    The ExporterConfigModel defines the configuration options common to all
+    exporters.  Each Exporter can subclass the ExporterConfigModel to add
+    additional options.
+    """
+
+    batch_max_lines: PositiveInt = Field(
+        default=5000, description="flush the export batch at this many samples",
+    )
+    batch_max_bytes: PositiveInt = Field(
+        default=1_000_000, description="split export payloads at this many bytes",
+    )
+    batch_max_latency: PositiveFloat = Field(
+        default=1.0, description="flush the export batch after this many seconds",
+    )
+    batch_max_inflight: PositiveInt = Field(
+        default=4, description="number of export workers, concurrent requests"
+    )
+    queue_max_batches: PositiveInt = Field(
+        default=100, description="maximum number of batches waiting for export"
+    )
+    queue_policy: Literal["drop_newest", "drop_oldest", "block"] = Field(
+        default="drop_oldest", description="what to do when the export queue is full"
+    )
+    retry_max_attempts: PositiveInt = Field(
+        default=3, description="number of attempts to deliver an export payload"
+    )
+    compression: Optional[Literal["gzip", "deflate"]] = Field(
+        description="content-encoding used to compress the export payloads"
+    )
+    compression_level: conint(ge=1, le=9) = Field(
+        default=6, description="compression level, 1 (fastest) to 9 (smallest)"
+    )
+    compression_min_bytes: PositiveInt = Field(
+        default=1024, description="do not compress payloads smaller than this"
+    )
+    suppress_heartbeat: Optional[PositiveFloat] = Field(
+        description="only export changed samples, and each series at this period"
+    )
+    suppress_deadbands: Dict[str, confloat(ge=0)] = Field(
+        default={}, description="minimum change of an exported sample, by metric name"
+    )
+    spool_directory: Optional[EnvExpand] = Field(
+        description="spool undelivered export payloads to this directory",
+    )
+    spool_max_bytes: PositiveInt = Field(
+        default=1 << 30, description="evict the oldest spool segments at this size"
+    )
+    spool_segment_bytes: PositiveInt = Field(
+        default=16 << 20, description="start a new spool segment at this size"
+    )
+    spool_replay_rate: PositiveFloat = Field(
+        default=10.0, description="maximum spooled payloads replayed per second"
+    )
+    spool_replay_interval: PositiveFloat = Field(
+        default=10.0, description="seconds between attempts to replay the spool"
+    )
+    spool_replay_max_attempts: PositiveInt = Field(
+        default=30, description="quarantine a spooled payload after this many failures"
+    )
 
 
 class ExporterBase(object):
+    """
+    The ExporterBase is the base type for defining an Exporter.
+
+    The metrics of many devices are coalesced by the ExportBatcher, see
+    `submit`, queued, and then exported as one batch by the `export_batch`
+    coroutine.  The samples of the combined batch carry their series id, see
+    nwkatk_netmon.series, and so the Exporter does not need to know which
+    device produced them.
+
+    An Exporter that pushes payloads to a server implements `encode_batch`,
+    to encode the batch into one or more payloads, and `send_payload`, to send
+    a payload; raising an exception when it cannot be delivered, or
+    PayloadRejected when the server rejects it.  The
+    `send_payload` coroutine uses the `compressor` to compress the payload
+    according to the exporter compression options.  When the
+    exporter is configured with a spool directory, the payloads that could not
+    be delivered are written to the on-disk spool and replayed later.  When the
+    exporter is configured with a suppression heartbeat, the unchanged samples
+    are dropped before they are batched, see `suppressor`.  An
+    Exporter that does not push payloads implements `export_batch` instead, and
+    can use `start` to start a server; it calls `commit` once the batch is
+    exported.
+
+    An Exporter written for the earlier, per-device, contract implements only
+    `export_metrics`, which is called with the device and the list of its
+    Metric instances.  Such an exporter is called directly on each submit,
+    without batching, suppression, or spooling; see `exports_metrics`.
+
+    In the multi-process worker mode, see nwkatk_netmon.workers, each worker
+    calls `setup_worker` on its exporters.  When the payloads are aggregated
+    the encoded payloads are forwarded to the supervisor process, which
+    delivers them using its own exporter connections.
+    """
+
     config: Optional[BaseModel] = None
 
     def __init__(self, name):
@@ -27,12 +141,169 @@ class ExporterBase(object):
         self.private = None
         self.tags = dict()
         self.creds = None
+        self.batcher: Optional[ExportBatcher] = None
+        self.spool: Optional[Spool] = None
+        self.forwarder: Optional["PayloadForwarder"] = None
+        self.suppressor: Optional[DeltaSuppressor] = None
+        self.stats = Counter()
+        self.compressor = PayloadCompressor(
+            encoding=None, level=6, min_bytes=0, stats=self.stats
+        )
 
     def prepare(self, config):
         raise NotImplementedError()
 
-    async def export_metrics(self, device: DriverBase, metrics: List[Metric]):
+    async def start(self):
+        """ start any exporter tasks or servers; called once the loop is running """
         pass
 
+    def setup_export(self, config: BaseModel):
+        """
+        Create the export batcher, and the spool if configured, using the
+        options of the exporter config; or the default options if the exporter
+        config model does not subclass ExporterConfigModel.
+        """
+        if not isinstance(config, ExporterConfigModel):
+            config = ExporterConfigModel()
+
+        self.batcher = ExportBatcher(exporter=self, config=config)
+        self.compressor = PayloadCompressor(
+            encoding=config.compression,
+            level=config.compression_level,
+            min_bytes=config.compression_min_bytes,
+            stats=self.stats,
+        )
+
+        if config.suppress_heartbeat:
+            self.suppressor = DeltaSuppressor(
+                heartbeat=config.suppress_heartbeat,
+                deadbands=config.suppress_deadbands,
+                stats=self.stats,
+            )
+
+        if config.spool_directory:
+            self.spool = Spool(
+                directory=Path(config.spool_directory) / self.name,
+                segment_bytes=config.spool_segment_bytes,
+                max_bytes=config.spool_max_bytes,
+            )
+
+    def setup_worker(self, index: int, forwarder: Optional["PayloadForwarder"] = None):
+        """
+        Setup the exporter of the worker process `index`.  When a forwarder is
+        provided the payloads are forwarded, and spooled if need be, by the
+        supervisor; otherwise each worker uses its own spool subdirectory.
+        """
+        self.forwarder = forwarder
+
+        if not (spool := self.spool):
+            return
+
+        if forwarder:
+            self.spool = None
+            return
+
+        self.spool = Spool(
+            directory=spool.directory / f"worker{index}",
+            segment_bytes=spool.segment_bytes,
+            max_bytes=spool.max_bytes,
+        )
+
+    @property
+    def exports_metrics(self) -> bool:
+        """ True when the exporter implements the per-device `export_metrics` """
+        return type(self).export_metrics is not ExporterBase.export_metrics
+
+    def _bind(self, device: DriverBase, metrics: MetricBatch) -> MetricBatch:
+        metrics = metrics.bind(device)
+        return self.suppressor.filter(metrics) if self.suppressor else metrics
+
+    async def submit(self, device: DriverBase, metrics: MetricBatch):
+        """ add the device metrics to the export batch """
+        if self.exports_metrics:
+            await self._export_device_metrics(device, metrics)
+            return
+
+        if metrics := self._bind(device, metrics):
+            await self.batcher.submit(metrics)
+
+    async def _export_device_metrics(self, device: DriverBase, metrics: MetricBatch):
+        try:
+            await self.export_metrics(device, metrics.to_metrics())
+
+        except Exception as exc:  # noqa
+            exc_name = exc.__class__.__name__
+            log.error(f"{self.name}: export failed: {exc_name}: {exc}")
+            self.stats["failed_batches"] += 1
+
+        else:
+            self.stats["exported_batches"] += 1
+            self.stats["exported_samples"] += len(metrics)
+
+    def encode_batch(self, metrics: MetricBatch) -> Iterable[bytes]:
+        raise NotImplementedError()
+
+    async def send_payload(self, payload: bytes):
+        raise NotImplementedError()
+
+    def count_retry(self, retry_state):  # noqa
+        """ the tenacity before_sleep callback, counts the payload send retries """
+        self.stats["retries"] += 1
+
+    async def export_batch(self, metrics: MetricBatch):
+        delivered = True
+        for payload in self.encode_batch(metrics):
+            delivered &= await self.deliver(payload)
+
+        if delivered:
+            self.commit(metrics)
+
+    def commit(self, metrics: MetricBatch):
+        """
+        Record the batch as exported, for the suppression of the unchanged
+        samples; called by `export_batch` once the batch is delivered or spooled.
+        """
+        if self.suppressor:
+            self.suppressor.commit(metrics)
+
+    async def deliver(self, payload: bytes) -> bool:
+        """
+        Send the payload, spooling it if it cannot be delivered.  Returns False
+        if the payload was dropped.
+        """
+        if self.forwarder:
+            await self.forwarder.send(self.name, payload)
+            return True
+
+        try:
+            await self.send_payload(payload)
+
+        except PayloadRejected as exc:
+            log.error(f"{self.name}: metrics rejected, dropping: {exc}")
+            self.stats["rejected_payloads"] += 1
+            return False
+
+        except Exception as exc:  # noqa
+            exc_name = exc.__class__.__name__
+            if not self.spool:
+                log.critical(f"{self.name}: Unable to send metrics: {exc_name}")
+                self.stats["dropped_payloads"] += 1
+                return False
+
+            log.error(f"{self.name}: Unable to send metrics: {exc_name}, spooling")
+            self.spool.append([payload])
+            self.stats["spooled_payloads"] += 1
+
+        return True
+
+    async def export_metrics(self, device: DriverBase, metrics: List[Metric]):
+        """
+        Export the metrics of a single device without batching.  An Exporter
+        that overrides this coroutine is called with the list of Metric
+        instances on each submit, see `exports_metrics`.
+        """
+        if batch := self._bind(device, MetricBatch.from_metrics(metrics)):
+            await self.export_batch(batch)
+
     def __str__(self):
         return self.name
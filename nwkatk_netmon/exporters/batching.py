@@ -0,0 +1,353 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the export batcher that coalesces the metrics of many
+devices into larger batches before they are handed to the exporter.  A batch is
+flushed when it reaches the configured number of samples, or when the oldest
+sample has waited the configured maximum latency.
+
+The flushed batches are placed on a bounded queue that is served by a pool of
+export workers.  Each exporter has its own batcher, and so a slow exporter does
+not stall, or grow the memory of, the other exporters.  When the queue is full
+the configured queue policy either drops the newest batch, drops the oldest
+queued batch, or blocks the submitter until there is room.  When the max latency
+timer flushes a batch under the "block" policy, at most one flushed batch waits
+for room in the queue; meanwhile the pending batch is held, and the submitters
+block once it reaches the size threshold.
+
+When the exporter has a spool, the batcher also runs the task that replays the
+spooled payloads, at a limited rate, once the exporter is reachable again.  A
+payload that the exporter rejects is dropped, and a payload that fails to
+replay `spool_replay_max_attempts` times is quarantined; so that neither
+blocks the replay of the later payloads.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Optional, List, Tuple, TYPE_CHECKING
+from pathlib import Path
+import asyncio
+import time
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon import MetricBatch
+from nwkatk_netmon.log import log
+from nwkatk_netmon.exporters.spool import PayloadRejected
+
+if TYPE_CHECKING:
+    from nwkatk_netmon.exporters import ExporterBase, ExporterConfigModel
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["ExportBatcher"]
+
+
+class ExportBatcher(object):
+    """
+    The ExportBatcher coalesces submitted metric batches, queues the combined
+    batches, and runs `batch_max_inflight` workers that call the exporter
+    `export_batch` coroutine.
+
+    Parameters
+    ----------
+    exporter:
+        The exporter instance that will export the combined batches.  The
+        batcher counters are kept in the exporter `stats`.
+
+    config:
+        The exporter config, providing the batch_*, queue_* and spool_replay_*
+        options.
+    """
+
+    def __init__(self, exporter: "ExporterBase", config: "ExporterConfigModel"):
+        self.exporter = exporter
+        self.max_lines = config.batch_max_lines
+        self.max_latency = config.batch_max_latency
+        self.workers = config.batch_max_inflight
+        self.queue_size = config.queue_max_batches
+        self.queue_policy = config.queue_policy
+        self.replay_rate = config.spool_replay_rate
+        self.replay_interval = config.spool_replay_interval
+        self.replay_max_attempts = config.spool_replay_max_attempts
+        self.stats = exporter.stats
+
+        self._pending: Optional[MetricBatch] = None
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flushed: Optional[MetricBatch] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = list()
+
+        # the failed replay attempts of the first undelivered payload, which is
+        # identified by its segment and the number of payloads that remain.
+
+        self._replay_head: Optional[Tuple[Path, int]] = None
+        self._replay_attempts = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def submit(self, metrics: MetricBatch):
+        """
+        Add the bound metrics batch to the pending batch, and queue the pending
+        batch if it has reached the size threshold.  When the queue policy is
+        "block", this coroutine waits until there is room in the queue.
+        """
+        self.start()
+
+        if self._pending is None:
+            self._pending = MetricBatch()
+            self._flush_timer = asyncio.get_event_loop().call_later(
+                self.max_latency, self.flush
+            )
+
+        self._pending.extend(metrics)
+
+        if len(self._pending) >= self.max_lines:
+            await self._enqueue(self._take_pending())
+
+    def flush(self):
+        """ queue the pending batch; called when the max latency timer expires """
+        if self._flush_task and not self._flush_task.done():
+            # the previous flushed batch is still waiting for room in the
+            # queue, try again after the max latency.
+
+            if self._pending is not None:
+                self._flush_timer = asyncio.get_event_loop().call_later(
+                    self.max_latency, self.flush
+                )
+            return
+
+        if not (metrics := self._take_pending()):
+            return
+
+        if self.queue_policy == "block":
+            self._flushed = metrics
+            self._flush_task = asyncio.create_task(self._put_flushed(metrics))
+        else:
+            self._put_nowait(metrics)
+
+    async def _put_flushed(self, metrics: MetricBatch):
+        await self._queue.put(metrics)
+        self._flushed = None
+
+    async def close(self):
+        """ queue the pending batch and wait for the workers to export all batches """
+        if self._flush_task:
+            await self._flush_task
+
+        if metrics := self._take_pending():
+            await self._enqueue(metrics)
+
+        if self._queue:
+            await self._queue.join()
+
+        for worker in self._workers:
+            worker.cancel()
+
+        self._workers.clear()
+
+    def stop(self):
+        """
+        Stop the workers and write the pending and queued batches to the
+        exporter spool, if any; used when the process is terminated.
+        """
+        for worker in self._workers:
+            worker.cancel()
+
+        self._workers.clear()
+
+        if self._flush_task:
+            self._flush_task.cancel()
+
+        batches = [self._flushed, self._take_pending()]
+        while self._queue and not self._queue.empty():
+            batches.append(self._queue.get_nowait())
+
+        batches = [metrics for metrics in batches if metrics]
+        samples = sum(map(len, batches))
+
+        if not (spool := self.exporter.spool):
+            if samples:
+                log.warning(f"{self.exporter.name}: dropping {samples} unsent samples")
+            return
+
+        for metrics in batches:
+            spool.append(self.exporter.encode_batch(metrics))
+
+        spool.flush()
+        spool.close()
+        log.info(f"{self.exporter.name}: spooled {samples} unsent samples")
+
+    def _take_pending(self) -> Optional[MetricBatch]:
+        if self._flush_timer:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+        metrics, self._pending = self._pending, None
+        return metrics
+
+    async def _enqueue(self, metrics: MetricBatch):
+        if self.queue_policy == "block":
+            await self._queue.put(metrics)
+        else:
+            self._put_nowait(metrics)
+
+    def _put_nowait(self, metrics: MetricBatch):
+        """ queue the batch, applying the drop queue policy if the queue is full """
+        if self._queue.full():
+            if self.queue_policy == "drop_oldest":
+                dropped = self._queue.get_nowait()
+                self._queue.task_done()
+                self._queue.put_nowait(metrics)
+            else:
+                dropped = metrics
+
+            self.stats["dropped_batches"] += 1
+            self.stats["dropped_samples"] += len(dropped)
+            log.warning(
+                f"{self.exporter.name}: export queue full, "
+                f"dropped batch of {len(dropped)} samples"
+            )
+            return
+
+        self._queue.put_nowait(metrics)
+
+    def start(self):
+        """ start the export workers, and the spool replay, if not yet started """
+        if self._workers:
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+        if self.exporter.spool is not None:
+            self._workers.append(asyncio.create_task(self._replay_spool()))
+
+    async def _worker(self):
+        while True:
+            metrics = await self._queue.get()
+            start = time.perf_counter()
+
+            try:
+                await self.exporter.export_batch(metrics)
+
+            except Exception as exc:  # noqa
+                exc_name = exc.__class__.__name__
+                log.error(f"{self.exporter.name}: export failed: {exc_name}: {exc}")
+                self.stats["failed_batches"] += 1
+
+            else:
+                self.stats["exported_batches"] += 1
+                self.stats["exported_samples"] += len(metrics)
+
+            finally:
+                self.stats["export_seconds"] += time.perf_counter() - start
+                self._queue.task_done()
+
+    async def _replay_spool(self):
+        """
+        Periodically replay the spool, oldest segment first.  If a payload
+        cannot be delivered the remaining payloads are kept in the segment and
+        the replay is tried again at the next interval.
+        """
+        spool = self.exporter.spool
+
+        while True:
+            await asyncio.sleep(self.replay_interval)
+
+            try:
+                await self._replay_segments(spool)
+
+            except Exception as exc:  # noqa
+                exc_name = exc.__class__.__name__
+                log.error(
+                    f"{self.exporter.name}: spool replay failed: {exc_name}: {exc}"
+                )
+
+            finally:
+                spool.replaying = None
+
+    async def _replay_segments(self, spool):
+        loop = asyncio.get_event_loop()
+
+        while segment := spool.oldest_segment():
+            spool.replaying = segment
+            payloads = await loop.run_in_executor(None, spool.read_segment, segment)
+            sent = await self._replay_payloads(segment, payloads)
+
+            if sent == len(payloads):
+                spool.remove_segment(segment)
+                continue
+
+            if sent:
+                await loop.run_in_executor(
+                    None, spool.rewrite_segment, segment, payloads[sent:]
+                )
+            break
+
+    async def _replay_payloads(self, segment: Path, payloads: List[bytes]) -> int:
+        """ returns the number of payloads replayed, dropped or quarantined """
+        for count, payload in enumerate(payloads):
+            try:
+                await self.exporter.send_payload(payload)
+
+            except PayloadRejected as exc:
+                log.error(f"{self.exporter.name}: spooled payload rejected: {exc}")
+                self.stats["rejected_payloads"] += 1
+
+            except Exception as exc:  # noqa
+                exc_name = exc.__class__.__name__
+                if not self._replay_failed(segment, len(payloads) - count):
+                    log.warning(
+                        f"{self.exporter.name}: spool replay paused: {exc_name}"
+                    )
+                    return count
+
+                log.error(
+                    f"{self.exporter.name}: spooled payload failed "
+                    f"{self.replay_max_attempts} times, quarantined: {exc_name}"
+                )
+                self.exporter.spool.quarantine(payload)
+                self.stats["quarantined_payloads"] += 1
+
+            else:
+                self.stats["replayed_payloads"] += 1
+
+            await asyncio.sleep(1 / self.replay_rate)
+
+        return len(payloads)
+
+    def _replay_failed(self, segment: Path, remaining: int) -> bool:
+        """ count a failed replay of the payload, True when it should be skipped """
+        if (head := (segment, remaining)) != self._replay_head:
+            self._replay_head, self._replay_attempts = head, 0
+
+        self._replay_attempts += 1
+        if self._replay_attempts < self.replay_max_attempts:
+            return False
+
+        self._replay_head = None
+        return True
@@ -16,15 +16,16 @@
 # System Imports
 # -----------------------------------------------------------------------------
 
-from itertools import chain
+from typing import List
+import json
+import math
 
 # -----------------------------------------------------------------------------
 # Public Imports
 # -----------------------------------------------------------------------------
 
 import httpx
-from tenacity import retry, wait_exponential
-from pydantic import BaseModel
+from tenacity import retry, retry_if_exception, wait_exponential, stop_after_attempt
 
 from nwkatk.config_model import EnvSecretUrl
 
@@ -32,13 +33,18 @@ from nwkatk.config_model import EnvSecretUrl
 # Private Imports
 # -----------------------------------------------------------------------------
 
-from nwkatk_netmon import Metric
+from nwkatk_netmon import MetricBatch
+from nwkatk_netmon.series import series_registry
 from nwkatk_netmon.log import log
-from nwkatk_netmon.drivers import DriverBase
-from nwkatk_netmon.exporters import ExporterBase
+from nwkatk_netmon.exporters import (
+    ExporterBase,
+    ExporterConfigModel,
+    PayloadRejected,
+    retryable,
+)
 
 
-class CirconusConfigModel(BaseModel):
+class CirconusConfigModel(ExporterConfigModel):
     circonus_datasubmission_url: EnvSecretUrl
 
 
@@ -49,45 +55,150 @@ class CirconusExporter(ExporterBase):
         super().__init__(name)
         self.post_url = None
         self.httpx = None
+        self.retry_attempts = None
+        self.encoder = None
 
     def prepare(self, config: CirconusConfigModel):
         self.post_url = config.circonus_datasubmission_url.get_secret_value()
         self.httpx = httpx.AsyncClient(
             verify=False, headers={"content-type": "application/json"},
         )
-
-    async def export_metrics(self, device: DriverBase, metrics):
-        log.debug(f"{device.name}: Exporting {len(metrics)} metrics")
-
-        post_data = dict(
-            make_circonus_metric(device_tags=device.tags, metric=metric,)
-            for metric in metrics
+        self.retry_attempts = config.retry_max_attempts
+        self.encoder = CirconusJSONEncoder(max_bytes=config.batch_max_bytes)
+
+    def encode_batch(self, metrics: MetricBatch) -> List[bytes]:
+        log.debug(f"{self.name}: Exporting {len(metrics)} metrics")
+        return self.encoder.encode(metrics)
+
+    async def send_payload(self, payload: bytes):
+        body, headers = await self.compressor.encode(payload)
+
+        @retry(
+            wait=wait_exponential(multiplier=1, min=4, max=10),
+            stop=stop_after_attempt(self.retry_attempts),
+            retry=retry_if_exception(retryable),
+            reraise=True,
+            before_sleep=self.count_retry,
         )
-
-        @retry(wait=wait_exponential(multiplier=1, min=4, max=10))
         async def to_circonus():
-            res = await self.httpx.put(self.post_url, json=post_data)
-            log.debug(f"{device.name}: Circonus PUT status {res.status_code}")
+            res = await self.httpx.put(self.post_url, data=body, headers=headers)
+            log.debug(f"{self.name}: Circonus PUT status {res.status_code}")
+            if not res.is_error:
+                return
 
-        try:
-            await to_circonus()
+            if 400 <= res.status_code < 500:
+                raise PayloadRejected(
+                    f"Circonus bad request {res.status_code}: {res.text}"
+                )
 
-        except Exception as exc:  # noqa
-            exc_name = exc.__class__.__name__
-            log.error(f"{device.name}: Unable to send metrics to Circonus: {exc_name}")
+            if 500 <= res.status_code < 600:
+                errmsg = f"{self.name}: Circonus unavailable: {res.status_code}"
+                log.error(errmsg)
+                raise RuntimeError(errmsg)
 
+        await to_circonus()
 
-def make_circonus_metric(device_tags, metric: Metric):
-    all_tags = chain(device_tags.items(), metric.tags.items())
 
+def _render_circonus_metric_name(name, tag_items) -> str:
     def to_str(value):
         if isinstance(value, bytes):
             return 'b"%s"' % value.decode("utf-8")
         else:
             return value
 
-    stream_tags = ",".join(f"{key}:{to_str(value)}" for key, value in all_tags)
+    stream_tags = ",".join(f"{key}:{to_str(value)}" for key, value in tag_items)
+    return f"{name}|ST[{stream_tags}]"
+
+
+# -----------------------------------------------------------------------------
+#
+#                               JSON Encoder
+#
+# -----------------------------------------------------------------------------
+
 
-    name = f"{metric.name}|ST[{stream_tags}]"
-    value = metric.value
-    return name, value
+class CirconusJSONEncoder(object):
+    """
+    The CirconusJSONEncoder encodes the samples of a bound MetricBatch, from
+    any number of devices, into HTTP Trap JSON payloads of the form
+    {"<name>|ST[<stream-tags>]": {"_type": <type>, "_value": <value>, "_ts":
+    <timestamp>}, ...}.  Each member is written into a reusable buffer from the
+    JSON encoded metric name, which is rendered once per series; so that
+    encoding a sample is the formatting of the value.
+
+    Each sample carries its timestamp, so that a payload replayed from the
+    spool is recorded at the collection time.  A batch can hold more than one
+    sample of a series, for example the batch of several polls, and so a new
+    payload is started when a series repeats; a JSON object cannot hold the
+    same member twice.
+
+    Parameters
+    ----------
+    max_bytes:
+        The payload is closed, and a new payload started, once it reaches this
+        size.
+    """
+
+    def __init__(self, max_bytes=1 << 20):
+        self.max_bytes = max_bytes
+        self._buffer = bytearray()
+
+    def encode(self, metrics: MetricBatch) -> List[bytes]:
+        """ encode the samples of the bound batch and return the list of payloads """
+        buffer = self._buffer
+        max_bytes = self.max_bytes
+        member_name = _circonus_json_member
+        payloads = list()
+        members = set()
+
+        def close_payload():
+            buffer.extend(b"}")
+            payloads.append(bytes(buffer))
+            buffer.clear()
+            members.clear()
+
+        for series_id, value, ts in metrics.samples():
+            value_type = type(value)
+            if value_type is float:
+                # JSON has no representation for NaN or infinity.
+                if not math.isfinite(value):
+                    continue
+                value = _FLOAT_VALUE + repr(value).encode()
+            elif value_type is int:
+                value = _INT_VALUE + b"%d" % value
+            else:
+                value = _STR_VALUE + json.dumps(str(value)).encode()
+
+            if series_id in members:
+                close_payload()
+
+            members.add(series_id)
+            buffer += b"," if buffer else b"{"
+            buffer += member_name(series_id)
+            buffer += value
+            buffer += b',"_ts":%d}' % ts
+
+            if len(buffer) >= max_bytes:
+                close_payload()
+
+        if buffer:
+            close_payload()
+
+        return payloads
+
+
+# the start of the sample member object, by the value type.
+
+_FLOAT_VALUE = b'{"_type":"n","_value":'
+_INT_VALUE = b'{"_type":"L","_value":'
+_STR_VALUE = b'{"_type":"s","_value":'
+
+
+def _render_circonus_json_member(name, tag_items) -> bytes:
+    metric_name = _render_circonus_metric_name(name, tag_items)
+    return json.dumps(metric_name).encode() + b":"
+
+
+_circonus_json_member = series_registry.key_format(
+    "circonus-json", _render_circonus_json_member
+)
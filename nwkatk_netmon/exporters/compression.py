@@ -0,0 +1,99 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the request body compression used by the exporters.  The
+export payloads, line protocol or stream-tag JSON, are very repetitive and
+compress well.  The compression is run in the event loop default executor so
+that compressing a large payload does not stall the collectors; zlib releases
+the GIL while it compresses.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Dict, Tuple
+from collections import Counter
+import asyncio
+import zlib
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["PayloadCompressor"]
+
+
+# the zlib wbits value for each content-encoding; "deflate" is the zlib format
+# as defined by RFC 7230.
+
+_ENCODING_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+
+class PayloadCompressor(object):
+    """
+    The PayloadCompressor compresses the export payloads that are at least
+    `min_bytes` long, and counts the raw and compressed bytes in the exporter
+    stats.
+
+    Parameters
+    ----------
+    encoding:
+        The content-encoding, "gzip" or "deflate", or None to send the
+        payloads uncompressed.
+
+    level:
+        The zlib compression level, 1 (fastest) to 9 (smallest).
+
+    min_bytes:
+        Payloads smaller than this are sent uncompressed.
+
+    stats:
+        The exporter stats; "raw_bytes" counts the payload bytes and
+        "compressed_bytes" the request body bytes as sent.
+    """
+
+    def __init__(self, encoding, level: int, min_bytes: int, stats: Counter):
+        self.encoding = encoding
+        self.level = level
+        self.min_bytes = min_bytes
+        self.stats = stats
+        self._headers = {"content-encoding": encoding} if encoding else {}
+
+    def compress(self, payload: bytes) -> bytes:
+        """ returns the compressed payload """
+        wbits = _ENCODING_WBITS[self.encoding]
+        zobj = zlib.compressobj(self.level, zlib.DEFLATED, wbits)
+        return zobj.compress(payload) + zobj.flush()
+
+    async def encode(self, payload: bytes) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Compress the payload in the default executor if it meets the size
+        threshold.
+
+        Returns
+        -------
+        The request body, and the request headers for the body content-encoding.
+        """
+        self.stats["raw_bytes"] += len(payload)
+
+        if not self.encoding or len(payload) < self.min_bytes:
+            self.stats["compressed_bytes"] += len(payload)
+            return payload, {}
+
+        loop = asyncio.get_event_loop()
+        body = await loop.run_in_executor(None, self.compress, payload)
+        self.stats["compressed_bytes"] += len(body)
+        return body, self._headers
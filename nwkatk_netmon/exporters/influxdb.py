@@ -16,7 +16,7 @@
 # System Imports
 # -----------------------------------------------------------------------------
 
-from itertools import chain
+from typing import List, Literal
 import re
 
 # -----------------------------------------------------------------------------
@@ -24,19 +24,24 @@ import re
 # -----------------------------------------------------------------------------
 
 import httpx
-from tenacity import retry, wait_exponential
+from tenacity import retry, retry_if_exception, wait_exponential, stop_after_attempt
+from pydantic import Field
 
-
-from nwkatk.config_model import EnvSecretUrl, NoExtraBaseModel
+from nwkatk.config_model import EnvSecretUrl
 
 # -----------------------------------------------------------------------------
 # Private Imports
 # -----------------------------------------------------------------------------
 
-from nwkatk_netmon import Metric
+from nwkatk_netmon import MetricBatch
+from nwkatk_netmon.series import series_registry
 from nwkatk_netmon.log import log
-from nwkatk_netmon.drivers import DriverBase
-from nwkatk_netmon.exporters import ExporterBase
+from nwkatk_netmon.exporters import (
+    ExporterBase,
+    ExporterConfigModel,
+    PayloadRejected,
+    retryable,
+)
 
 # -----------------------------------------------------------------------------
 # Exports
@@ -45,9 +50,16 @@ from nwkatk_netmon.exporters import ExporterBase
 __all__ = []
 
 
-class InfluxDBConfigModel(NoExtraBaseModel):
+class InfluxDBConfigModel(ExporterConfigModel):
     server_url: EnvSecretUrl
     database: str
+    precision: Literal["ns", "u", "ms", "s"] = Field(
+        default="ms", description="timestamp precision of the exported metrics"
+    )
+    integer_fields: bool = Field(
+        default=False,
+        description="export integer values, such as status, as integer fields",
+    )
 
 
 class InfluxDBExporter(ExporterBase):
@@ -58,56 +70,174 @@ class InfluxDBExporter(ExporterBase):
         self.server_url = None
         self.post_url = None
         self.httpx = None
+        self.encoder = None
+        self.retry_attempts = None
 
     def prepare(self, config: InfluxDBConfigModel):
         self.server_url = config.server_url.get_secret_value()
-        self.post_url = f"{self.server_url}/write?db={config.database}"
+        self.post_url = (
+            f"{self.server_url}/write?db={config.database}"
+            f"&precision={config.precision}"
+        )
         self.httpx = httpx.AsyncClient(verify=False)
+        self.retry_attempts = config.retry_max_attempts
+        self.encoder = InfluxDBLineEncoder(
+            precision=config.precision,
+            integer_fields=config.integer_fields,
+            max_bytes=config.batch_max_bytes,
+        )
 
-    async def export_metrics(self, device: DriverBase, metrics):
-        log.debug(f"{device.name}: exporting {len(metrics)} metrics to InfluxDB")
+    def encode_batch(self, metrics: MetricBatch) -> List[bytes]:
+        log.debug(f"{self.name}: exporting {len(metrics)} metrics to InfluxDB")
+        return self.encoder.encode(metrics)
 
-        metrics_data = "\n".join(
-            _make_influxdb_metric(device_tags=device.tags, metric=metric)
-            for metric in metrics
-        )
+    async def send_payload(self, payload: bytes):
+        body, headers = await self.compressor.encode(payload)
 
-        @retry(wait=wait_exponential(multiplier=1, min=4, max=10))
+        @retry(
+            wait=wait_exponential(multiplier=1, min=4, max=10),
+            stop=stop_after_attempt(self.retry_attempts),
+            retry=retry_if_exception(retryable),
+            reraise=True,
+            before_sleep=self.count_retry,
+        )
         async def post_metrics():
             res: httpx.Response = await self.httpx.post(
-                self.post_url, data=metrics_data.encode()
+                self.post_url, data=body, headers=headers
             )
-            log.debug(f"{device.name}: InflusDB POST status {res.status_code}")
+            log.debug(f"{self.name}: InflusDB POST status {res.status_code}")
             if not res.is_error:
                 return
 
             if 400 <= res.status_code < 500:
-                errmsg = f"{device.name}: InfluxDB bad request, skipping: {res.json()}"
-                log.error(errmsg)
+                raise PayloadRejected(
+                    f"InfluxDB bad request {res.status_code}: {res.text}"
+                )
 
             if 500 <= res.status_code < 600:
-                errmsg = f"{device.name}: InfluxDB unavailable: {res.json()}"
+                errmsg = f"{self.name}: InfluxDB unavailable: {res.text}"
                 log.error(errmsg)
                 raise RuntimeError(errmsg)
 
-        try:
-            await post_metrics()
+        await post_metrics()
 
-        except Exception as exc:  # noqa
-            exc_name = exc.__class__.__name__
-            log.critical(
-                f"{device.name}: Unable to send metrics to InfluxDB: {exc_name}"
-            )
+
+# -----------------------------------------------------------------------------
+#
+#                            Line Protocol Encoder
+#
+# -----------------------------------------------------------------------------
+
+# the multiplier (or divisor for seconds) used to convert the metric timestamp,
+# in milli-seconds, to the write precision.
+
+_PRECISION_MULTIPLIER = {"ns": 1_000_000, "u": 1_000, "ms": 1}
+
+
+class InfluxDBLineEncoder(object):
+    """
+    The InfluxDBLineEncoder encodes the samples of a bound MetricBatch into
+    InfluxDB line-protocol payloads.  Each line is written into a reusable
+    buffer from the pre-escaped series prefix, "<name>,<tags> value=", which is
+    rendered once per series; so that encoding a sample is the formatting of
+    the value and timestamp.
+
+    Parameters
+    ----------
+    precision:
+        The timestamp precision, one of "ns", "u", "ms", or "s".  This must
+        match the precision parameter of the write URL.
+
+    integer_fields:
+        When True, integer values are written as integer fields, for example
+        "value=1i".  When False, integer values are written as float fields;
+        which is the type used by prior netmon versions.
+
+    max_bytes:
+        The payload is split once it reaches this size.
+    """
+
+    def __init__(self, precision: str = "ms", integer_fields=False, max_bytes=1 << 20):
+        self.precision = precision
+        self.integer_fields = integer_fields
+        self.max_bytes = max_bytes
+        self._buffer = bytearray()
+
+    def encode(self, metrics: MetricBatch) -> List[bytes]:
+        """
+        Encode the samples of the bound batch and return the list of payloads.
+        The payloads are produced in one pass so that the reusable buffer is not
+        shared between concurrent exports.
+        """
+        buffer = self._buffer
+        max_bytes = self.max_bytes
+        series_prefix = _influxdb_series_prefix
+        int_format = b"%di" if self.integer_fields else b"%d"
+        ts_values = self._precision_timestamps(metrics)
+        payloads = list()
+
+        for series_id, value, ts in zip(metrics.series_ids, metrics.values, ts_values):
+            buffer += series_prefix(series_id)
+
+            value_type = type(value)
+            if value_type is float:
+                buffer += repr(value).encode()
+            elif value_type is int:
+                buffer += int_format % value
+            elif value_type is bool:
+                buffer += b"true" if value else b"false"
+            else:
+                buffer += _string_field(value)
+
+            buffer += b" %d\n" % ts
+
+            if len(buffer) >= max_bytes:
+                payloads.append(bytes(buffer))
+                buffer.clear()
+
+        if buffer:
+            payloads.append(bytes(buffer))
+            buffer.clear()
+
+        return payloads
+
+    def _precision_timestamps(self, metrics: MetricBatch):
+        if self.precision == "s":
+            return (ts // 1000 for ts in metrics.timestamps)
+
+        if (multiplier := _PRECISION_MULTIPLIER[self.precision]) == 1:
+            return metrics.timestamps
+
+        return (ts * multiplier for ts in metrics.timestamps)
 
 
 _re_escape_chars = re.compile(r"[\s,=]").sub
+_re_escape_measurement = re.compile(r"[\s,]").sub
 
 
 def _escape_tag_value(value):
-    return _re_escape_chars(lambda mo: f"\\{mo.group()}", value)
+    return _re_escape_chars(lambda mo: f"\\{mo.group()}", str(value))
+
+
+def _string_field(value) -> bytes:
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{value}"'.encode()
+
+
+def _render_influxdb_series_prefix(name, tag_items) -> bytes:
+    """
+    Render the line-protocol prefix for the series.  Tags with empty values are
+    omitted since InfluxDB rejects them.
+    """
+    measurement = _re_escape_measurement(lambda mo: f"\\{mo.group()}", name)
+    labels = "".join(
+        f",{_escape_tag_value(tag)}={_escape_tag_value(value)}"
+        for tag, value in tag_items
+        if value not in (None, "")
+    )
+    return f"{measurement}{labels} value=".encode()
 
 
-def _make_influxdb_metric(device_tags, metric: Metric) -> str:
-    all_tags = chain(device_tags.items(), metric.tags.items())
-    labels = ",".join(f"{tag}={_escape_tag_value(value)}" for tag, value in all_tags)
-    return f"{metric.name},{labels} value={metric.value} {metric.ts * 1_000_000}"
+_influxdb_series_prefix = series_registry.key_format(
+    "influxdb", _render_influxdb_series_prefix
+)
@@ -0,0 +1,363 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the Prometheus exporter.  Rather than pushing the metrics,
+the exporter keeps the latest value of each series and serves them in the
+Prometheus text exposition format for the Prometheus server to scrape.
+
+The exposition is cached.  Each series line is rendered when the series value
+changes, and the lines are grouped by metric family so that a scrape only
+re-joins the families that changed since the previous scrape.  Series that are
+not updated within the stale period, for example of a device that stopped
+reporting, are removed.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Dict, List, Set, Optional, Tuple
+import asyncio
+import math
+import time
+import re
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+from pydantic import Field, PositiveInt, PositiveFloat, validator
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon import MetricBatch
+from nwkatk_netmon.series import series_registry
+from nwkatk_netmon.log import log
+from nwkatk_netmon.exporters import ExporterBase, ExporterConfigModel
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = []
+
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_REQUEST_TIMEOUT = 10
+
+
+class PrometheusConfigModel(ExporterConfigModel):
+    listen_host: str = Field(
+        default="0.0.0.0", description="address of the scrape HTTP server"
+    )
+    listen_port: PositiveInt = Field(
+        default=9469, description="port of the scrape HTTP server"
+    )
+    metrics_path: str = Field(default="/metrics", description="scrape URL path")
+    stale_after: PositiveFloat = Field(
+        default=300.0, description="remove series not updated for this many seconds"
+    )
+
+    @validator("spool_directory")
+    def _no_spool(cls, value):
+        if value:
+            raise ValueError("the prometheus exporter does not use a spool")
+        return value
+
+
+class PrometheusExporter(ExporterBase):
+    config = PrometheusConfigModel
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.listen_host = None
+        self.listen_port = None
+        self.metrics_path = None
+        self.stale_after = None
+        self.exposition: Optional[ExpositionCache] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._expire_task: Optional[asyncio.Task] = None
+        self._compressed: Tuple[Optional[bytes], Optional[bytes]] = (None, None)
+
+    def prepare(self, config: PrometheusConfigModel):
+        self.listen_host = config.listen_host
+        self.listen_port = config.listen_port
+        self.metrics_path = config.metrics_path
+        self.stale_after = config.stale_after
+        self.exposition = ExpositionCache(stale_after=config.stale_after)
+
+    def setup_worker(self, index: int, forwarder=None):
+        # each worker serves the metrics of its devices on its own port.
+        super().setup_worker(index, forwarder)
+        self.listen_port += index
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self._serve_request, host=self.listen_host, port=self.listen_port
+        )
+        self._expire_task = asyncio.create_task(self._expire_series())
+        log.info(
+            f"{self.name}: serving metrics on "
+            f"{self.listen_host}:{self.listen_port}{self.metrics_path}"
+        )
+
+    async def export_batch(self, metrics: MetricBatch):
+        if skipped := self.exposition.update(metrics):
+            self.stats["non_numeric_samples"] += skipped
+
+        self.commit(metrics)
+
+    async def _expire_series(self):
+        while True:
+            await asyncio.sleep(self.stale_after / 2)
+            try:
+                if expired := self.exposition.expire():
+                    log.info(f"{self.name}: removed {expired} stale series")
+
+            except Exception as exc:  # noqa
+                exc_name = exc.__class__.__name__
+                log.error(f"{self.name}: series expiry failed: {exc_name}: {exc}")
+
+    async def _serve_request(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(
+                reader.readuntil(b"\r\n\r\n"), timeout=_REQUEST_TIMEOUT
+            )
+            request_line, *header_lines = request.decode("latin-1").split("\r\n")
+            method, path, _ = request_line.split(" ", 2)
+
+            headers = dict()
+            for line in filter(None, header_lines):
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            if method != "GET" or path.split("?")[0] != self.metrics_path:
+                await self._write_response(writer, b"404 Not Found", b"not found\n")
+                return
+
+            body, encoding = await self._scrape_body(headers.get("accept-encoding"))
+            await self._write_response(writer, b"200 OK", body, encoding)
+            self.stats["scrapes"] += 1
+
+        except (
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+            asyncio.TimeoutError,
+            ConnectionError,
+            ValueError,
+        ) as exc:
+            log.debug(f"{self.name}: bad scrape request: {exc.__class__.__name__}")
+
+        finally:
+            writer.close()
+
+    async def _scrape_body(self, accept_encoding: Optional[str]):
+        """
+        returns the exposition body and content-encoding; the body is compressed,
+        once per exposition change, when the compression option is set and the
+        scraper accepts the encoding.
+        """
+        body = self.exposition.render()
+        encoding = self.compressor.encoding
+
+        if (
+            not encoding
+            or encoding not in (accept_encoding or "")
+            or len(body) < self.compressor.min_bytes
+        ):
+            return body, None
+
+        cached_body, compressed = self._compressed
+        if cached_body is not body:
+            loop = asyncio.get_event_loop()
+            compress = self.compressor.compress
+            compressed = await loop.run_in_executor(None, compress, body)
+            self._compressed = (body, compressed)
+
+        return compressed, encoding
+
+    @staticmethod
+    async def _write_response(writer, status: bytes, body: bytes, encoding=None):
+        headers = [
+            b"HTTP/1.1 " + status,
+            b"Content-Type: " + _CONTENT_TYPE.encode(),
+            b"Content-Length: %d" % len(body),
+            b"Connection: close",
+        ]
+        if encoding:
+            headers.append(b"Content-Encoding: " + encoding.encode())
+
+        writer.write(b"\r\n".join(headers) + b"\r\n\r\n")
+        writer.write(body)
+        await writer.drain()
+
+
+# -----------------------------------------------------------------------------
+#
+#                              Exposition Cache
+#
+# -----------------------------------------------------------------------------
+
+
+class ExpositionCache(object):
+    """
+    The ExpositionCache keeps the rendered exposition line of the latest value
+    of each series, grouped by metric family, and the rendered exposition.
+
+    Parameters
+    ----------
+    stale_after:
+        The number of seconds after which a series that was not updated is
+        removed, see `expire`.
+    """
+
+    def __init__(self, stale_after: float):
+        self.stale_after = stale_after
+        self._families: Dict[str, Dict[int, bytes]] = dict()
+        self._updated: Dict[int, float] = dict()
+        self._chunks: Dict[str, bytes] = dict()
+        self._dirty: Set[str] = set()
+        self._body: Optional[bytes] = None
+        series_registry.add_release_hook(self.release)
+
+    def __len__(self):
+        return len(self._updated)
+
+    def update(self, metrics: MetricBatch) -> int:
+        """
+        store the samples of the bound batch as the latest series values, and
+        return the number of samples skipped because their value is not numeric.
+        """
+        families = self._families
+        updated = self._updated
+        dirty = self._dirty
+        now = time.monotonic()
+        skipped = 0
+
+        for series_id, value in zip(metrics.series_ids, metrics.values):
+            if (formatted := _format_value(value)) is None:
+                skipped += 1
+                continue
+
+            family, prefix = _prometheus_series(series_id)
+
+            if (lines := families.get(family)) is None:
+                lines = families[family] = dict()
+
+            line = prefix + formatted
+            if lines.get(series_id) != line:
+                lines[series_id] = line
+                dirty.add(family)
+
+            updated[series_id] = now
+
+        if dirty:
+            self._body = None
+
+        return skipped
+
+    def expire(self) -> int:
+        """ remove the series that are stale, and return the number removed """
+        expire_before = time.monotonic() - self.stale_after
+        stale = [sid for sid, ts in self._updated.items() if ts < expire_before]
+        self._remove(stale)
+        return len(stale)
+
+    def release(self, series_ids: List[int]):
+        """ remove the series released by the series registry """
+        updated = self._updated
+        self._remove([series_id for series_id in series_ids if series_id in updated])
+
+    def _remove(self, stale: List[int]):
+        for series_id in stale:
+            family, _ = _prometheus_series(series_id)
+            del self._families[family][series_id]
+            del self._updated[series_id]
+            self._dirty.add(family)
+
+        if stale:
+            self._body = None
+
+    def render(self) -> bytes:
+        """ returns the exposition, re-joining only the families that changed """
+        if self._body is not None:
+            return self._body
+
+        for family in self._dirty:
+            if lines := self._families[family]:
+                type_line = b"# TYPE %s gauge\n" % family.encode()
+                self._chunks[family] = type_line + b"".join(lines.values())
+            else:
+                del self._families[family]
+                self._chunks.pop(family, None)
+
+        self._dirty.clear()
+        self._body = b"".join(self._chunks.values())
+        return self._body
+
+
+_re_invalid_name_chars = re.compile(r"[^a-zA-Z0-9_:]").sub
+_re_invalid_label_chars = re.compile(r"[^a-zA-Z0-9_]").sub
+
+
+def _sanitize_name(name: str, sub=_re_invalid_name_chars) -> str:
+    name = sub("_", name)
+    return f"_{name}" if name[:1].isdigit() else name
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value) -> Optional[bytes]:
+    """ returns the exposition value, or None if the value is not numeric """
+    if type(value) is int:
+        return b"%d\n" % value
+
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+
+    if math.isfinite(value):
+        return repr(value).encode() + b"\n"
+
+    if math.isnan(value):
+        return b"NaN\n"
+
+    return b"+Inf\n" if value > 0 else b"-Inf\n"
+
+
+def _render_prometheus_series(name, tag_items) -> Tuple[str, bytes]:
+    """
+    Render the metric family name and the exposition line prefix for the series.
+    Tags with empty values are omitted, and a metric tag overrides a device tag
+    of the same name.
+    """
+    labels = dict()
+    for tag, value in tag_items:
+        if value not in (None, ""):
+            labels[_sanitize_name(tag, _re_invalid_label_chars)] = value
+
+    family = _sanitize_name(name)
+    label_str = ",".join(
+        f'{tag}="{_escape_label_value(value)}"' for tag, value in labels.items()
+    )
+    return family, f"{family}{{{label_str}}} ".encode()
+
+
+_prometheus_series = series_registry.key_format("prometheus", _render_prometheus_series)
@@ -0,0 +1,239 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the on-disk spool used by the exporters to keep the export
+payloads that could not be delivered, for example while the TSDB is down.  The
+spool is a directory of append-only segment files.  Each record in a segment is
+a 4-byte length prefix followed by the encoded export payload.  Writes are
+buffered, and a new segment is started once the current segment reaches the
+segment size.  Each append is written through to the segment file, so that the
+spooled payloads are not lost if the process is killed; `flush` also syncs the
+file to disk.  When the spool exceeds its maximum size the oldest segments are
+evicted, other than the segment being replayed, see `replaying`.
+
+A payload that repeatedly fails to replay is moved to the quarantine file of
+the spool directory, so that it does not block the replay of the later
+payloads; the quarantine file has the same record format and is not replayed.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import List, Iterable, Optional, BinaryIO
+from pathlib import Path
+import struct
+import os
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon.log import log
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["Spool", "PayloadRejected"]
+
+
+_RECORD_HEADER = struct.Struct("!I")
+_SEGMENT_SUFFIX = ".spool"
+_QUARANTINE_FILE = "quarantine.rej"
+_WRITE_BUFFER_SIZE = 1 << 20
+
+
+class PayloadRejected(Exception):
+    """
+    Raised by an exporter `send_payload` when the server rejects the payload,
+    for example a 4xx response; the payload is dropped rather than spooled,
+    since sending it again would fail again.
+    """
+
+
+class Spool(object):
+    """
+    The Spool stores export payloads in append-only segment files.
+
+    Parameters
+    ----------
+    directory:
+        The spool directory, created if it does not exist.  Segments left in the
+        directory by a previous run are kept and will be replayed.
+
+    segment_bytes:
+        Start a new segment once the current segment reaches this size.
+
+    max_bytes:
+        Evict the oldest segments once the spool exceeds this size.
+
+    Attributes
+    ----------
+    replaying: Path, optional
+        The segment being replayed, which is not evicted; set by the replay
+        task, see ExportBatcher.
+    """
+
+    def __init__(self, directory: Path, segment_bytes: int, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.evicted_segments = 0
+        self.replaying: Optional[Path] = None
+
+        self._segments: List[Path] = sorted(
+            self.directory.glob(f"*{_SEGMENT_SUFFIX}"), key=_segment_seqno
+        )
+        self._next_seqno = (
+            _segment_seqno(self._segments[-1]) + 1 if self._segments else 0
+        )
+        self._writer: Optional[BinaryIO] = None
+        self._writer_bytes = 0
+
+    @property
+    def size(self) -> int:
+        """ the total size of the spool in bytes """
+        closed = sum(path.stat().st_size for path in self._closed_segments)
+        return closed + self._writer_bytes
+
+    def __bool__(self):
+        return bool(self._segments)
+
+    def append(self, payloads: Iterable[bytes]):
+        """
+        append the payloads to the current segment; the payloads are written to
+        the segment file before returning, so that they survive the process.
+        """
+        for payload in payloads:
+            if self._writer is None:
+                self._open_segment()
+
+            self._writer.write(_RECORD_HEADER.pack(len(payload)))
+            self._writer.write(payload)
+            self._writer_bytes += _RECORD_HEADER.size + len(payload)
+
+            if self._writer_bytes >= self.segment_bytes:
+                self._close_segment()
+                self._evict()
+
+        if self._writer:
+            self._writer.flush()
+
+    def flush(self):
+        """ flush the buffered writes of the current segment to disk """
+        if self._writer:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+
+    def close(self):
+        self._close_segment()
+
+    def oldest_segment(self) -> Optional[Path]:
+        """
+        returns the oldest segment for replay; if the only segment is the current
+        segment, then it is closed first.
+        """
+        if not self._segments:
+            return None
+
+        if not self._closed_segments:
+            self._close_segment()
+
+        return self._segments[0]
+
+    @staticmethod
+    def read_segment(path: Path) -> List[bytes]:
+        """ returns the payloads stored in the segment """
+        payloads = list()
+        data = path.read_bytes()
+        offset, end = 0, len(data)
+
+        while offset + _RECORD_HEADER.size <= end:
+            (length,) = _RECORD_HEADER.unpack_from(data, offset)
+            offset += _RECORD_HEADER.size
+            if offset + length > end:
+                log.warning(f"spool {path}: truncated record, ignoring")
+                break
+
+            payloads.append(data[offset : offset + length])
+            offset += length
+
+        return payloads
+
+    def remove_segment(self, path: Path):
+        """ remove the segment once its payloads have been delivered """
+        if path in self._segments:
+            self._segments.remove(path)
+
+        path.unlink(missing_ok=True)
+
+    def rewrite_segment(self, path: Path, payloads: List[bytes]):
+        """ replace the segment content with the payloads not yet delivered """
+
+        # the segment was removed, do not write it back.
+
+        if path not in self._segments:
+            return
+
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as ofile:
+            for payload in payloads:
+                ofile.write(_RECORD_HEADER.pack(len(payload)))
+                ofile.write(payload)
+
+        tmp_path.replace(path)
+
+    def quarantine(self, payload: bytes):
+        """ append the payload, that could not be replayed, to the quarantine file """
+        with open(self.directory / _QUARANTINE_FILE, "ab") as ofile:
+            ofile.write(_RECORD_HEADER.pack(len(payload)))
+            ofile.write(payload)
+
+    @property
+    def _closed_segments(self) -> List[Path]:
+        return self._segments[:-1] if self._writer else self._segments
+
+    def _open_segment(self):
+        path = self.directory / f"{self._next_seqno:012d}{_SEGMENT_SUFFIX}"
+        self._next_seqno += 1
+        self._writer = open(path, "ab", buffering=_WRITE_BUFFER_SIZE)
+        self._writer_bytes = 0
+        self._segments.append(path)
+
+    def _close_segment(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+            self._writer_bytes = 0
+
+    def _evict(self):
+        # the newest segment, and the segment being replayed, are always kept.
+
+        while self.size > self.max_bytes:
+            evictable = [path for path in self._segments[:-1] if path != self.replaying]
+            if not evictable:
+                break
+
+            path = evictable[0]
+            self._segments.remove(path)
+            path.unlink(missing_ok=True)
+            self.evicted_segments += 1
+            log.warning(f"spool {self.directory}: size limit, evicted {path.name}")
+
+
+def _segment_seqno(path: Path) -> int:
+    return int(path.stem)
@@ -0,0 +1,146 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the change-only export stage.  Most of the IF DOM samples,
+and the status samples in particular, do not change from one poll to the next.
+The DeltaSuppressor keeps the last exported value of each series and only
+passes a sample when its value has changed by more than the metric deadband
+since the last exported sample, or when the heartbeat period has expired; so
+that every series is still exported at least once per heartbeat.  The last
+exported values are only recorded once the exporter has delivered, or spooled,
+the batch, see `commit`; so that a change in a batch that was dropped is
+exported again by the next poll.
+
+The last exported values are kept in lists indexed by the series id, which are
+dense integers; see nwkatk_netmon.series.  The values of the released series
+ids are reset, since the ids are re-used.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Any, Dict, List
+from numbers import Number
+from collections import Counter
+from array import array
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon import MetricBatch
+from nwkatk_netmon.series import series_registry
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["DeltaSuppressor"]
+
+
+# the last exported timestamp of a series that has not been exported.
+
+_NEVER = -(1 << 62)
+
+
+class DeltaSuppressor(object):
+    """
+    The DeltaSuppressor filters a bound metrics batch down to the samples that
+    changed, or whose heartbeat expired.
+
+    Parameters
+    ----------
+    heartbeat:
+        The maximum time, in seconds, between the exported samples of a series.
+
+    deadbands:
+        The minimum absolute change, by metric name, of an exported sample; the
+        metrics without a deadband are exported on any change.
+
+    stats:
+        The exporter stats, counting the "suppressed_samples".
+    """
+
+    def __init__(self, heartbeat: float, deadbands: Dict[str, float], stats: Counter):
+        self.heartbeat_ms = int(heartbeat * 1000)
+        self.deadbands = deadbands
+        self.stats = stats
+        self._last_values: List[Any] = list()
+        self._last_ts = array("q")
+        series_registry.add_release_hook(self.release)
+
+    def filter(self, metrics: MetricBatch) -> MetricBatch:
+        """ returns the batch of the samples to export; the batch must be bound """
+        self._grow(metrics)
+        last_values, last_ts = self._last_values, self._last_ts
+        heartbeat_ms, deadbands = self.heartbeat_ms, self.deadbands
+        selectors = list()
+
+        for name, series_id, value, ts in zip(
+            metrics.names, metrics.series_ids, metrics.values, metrics.timestamps
+        ):
+            last = last_values[series_id]
+
+            if ts - last_ts[series_id] < heartbeat_ms and (
+                value == last
+                or (
+                    (deadband := deadbands.get(name))
+                    and isinstance(value, Number)
+                    and isinstance(last, Number)
+                    and abs(value - last) <= deadband
+                )
+            ):
+                selectors.append(False)
+                continue
+
+            selectors.append(True)
+
+        if (suppressed := selectors.count(False)) == 0:
+            return metrics
+
+        self.stats["suppressed_samples"] += suppressed
+        return metrics.compress(selectors)
+
+    def commit(self, metrics: MetricBatch):
+        """ record the samples of the exported batch as the last exported values """
+        self._grow(metrics)
+        last_values, last_ts = self._last_values, self._last_ts
+
+        # the batches can be exported out of order, keep the newest sample.
+
+        for series_id, value, ts in metrics.samples():
+            if ts >= last_ts[series_id]:
+                last_values[series_id] = value
+                last_ts[series_id] = ts
+
+    def _grow(self, metrics: MetricBatch):
+        # grow the last value lists to the largest series id of the batch.
+
+        last_values, last_ts = self._last_values, self._last_ts
+        if (size := max(metrics.series_ids, default=-1) + 1) > len(last_ts):
+            grow = size - len(last_ts)
+            last_values.extend([None] * grow)
+            last_ts.extend([_NEVER] * grow)
+
+    def release(self, series_ids: List[int]):
+        """ reset the last values of the series released by the series registry """
+        last_values, last_ts = self._last_values, self._last_ts
+        size = len(last_ts)
+
+        for series_id in series_ids:
+            if series_id < size:
+                last_values[series_id] = None
+                last_ts[series_id] = _NEVER
@@ -0,0 +1,159 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the per-device circuit breaker.  A device is "healthy" while
+its polls succeed, and "degraded" after a failed poll.  After `failure_threshold`
+consecutive failed polls, or a failed login, the circuit is "open": the
+CollectorExecutor pauses the device collector jobs, so that the device does
+not use scheduler ticks nor device request slots, and retries the device login
+with an exponential backoff.  Once the login succeeds the circuit is
+"half_open" and one of the collector jobs is resumed as the probe; its next poll
+either closes the circuit, the device is healthy again and the other jobs are
+resumed, or re-opens it with a longer backoff.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+import asyncio
+import random
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+from pydantic import Field, PositiveInt, PositiveFloat
+from nwkatk.config_model import NoExtraBaseModel
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["HealthModel", "DeviceCircuit"]
+
+
+class HealthModel(NoExtraBaseModel):
+    failure_threshold: PositiveInt = Field(
+        default=3, description="consecutive failed polls that open the device circuit"
+    )
+    backoff_min: PositiveFloat = Field(
+        default=30.0, description="seconds before the first device login retry"
+    )
+    backoff_max: PositiveFloat = Field(
+        default=900.0, description="maximum seconds between device login retries"
+    )
+
+
+class DeviceCircuit(object):
+    """
+    The DeviceCircuit is the health state machine of a device.
+
+    Parameters
+    ----------
+    name:
+        The device name.
+
+    config:
+        The health options.
+
+    Attributes
+    ----------
+    state: str
+        One of "healthy", "degraded", "open" or "half_open".
+
+    failures: int
+        The number of consecutive failures.
+
+    backoff: float
+        The current login retry backoff, in seconds.
+
+    opened: int
+        The number of times the circuit has opened.
+    """
+
+    HEALTHY = "healthy"
+    DEGRADED = "degraded"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    STATES = (HEALTHY, DEGRADED, OPEN, HALF_OPEN)
+
+    def __init__(self, name: str, config: HealthModel):
+        self.name = name
+        self.config = config
+        self.state = self.HEALTHY
+        self.failures = 0
+        self.backoff = config.backoff_min
+        self.opened = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def record_success(self):
+        """ record a successful poll, closing the circuit """
+        if self.state == self.OPEN:
+            return
+
+        self.state = self.HEALTHY
+        self.failures = 0
+        self.backoff = self.config.backoff_min
+
+    def record_failure(self) -> bool:
+        """
+        Record a failed poll.
+
+        Returns
+        -------
+        True when the failure opened the circuit.
+        """
+        if self.state == self.OPEN:
+            return False
+
+        self.failures += 1
+
+        threshold = self.config.failure_threshold
+        if self.state == self.HALF_OPEN or self.failures >= threshold:
+            self.trip()
+            return True
+
+        self.state = self.DEGRADED
+        return False
+
+    def trip(self):
+        """ open the circuit, doubling the backoff if it was not closed """
+        if self.state in (self.OPEN, self.HALF_OPEN):
+            self.backoff = min(self.backoff * 2, self.config.backoff_max)
+        else:
+            self.backoff = self.config.backoff_min
+            self.opened += 1
+
+        self.state = self.OPEN
+
+    def half_open(self):
+        """ the device login succeeded, the next poll is the probe """
+        if self.state == self.OPEN:
+            self.state = self.HALF_OPEN
+
+    async def wait_retry(self):
+        """
+        wait for the backoff, with jitter so that the devices of a failed site
+        do not all retry at the same time.
+        """
+        await asyncio.sleep(self.backoff * random.uniform(0.5, 1.0))
+
+    def __str__(self):
+        return f"{self.name}: {self.state}"
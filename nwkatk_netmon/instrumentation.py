@@ -0,0 +1,384 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the netmon self-instrumentation.  The netmon pipeline is
+described by Metric types with the "netmon_" prefix, which are exported through
+the configured exporters like any collector metric.
+
+The per-poll metrics are added to the metrics batch of the polled device, and so
+carry the device tags.  The process metrics, the exporters, the scheduler, the
+device health states and the event loop, are reported periodically with the
+"netmon_host" tag.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Optional, Dict, List, TYPE_CHECKING
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import socket
+import time
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+from pydantic.dataclasses import dataclass
+from pydantic import conint
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon import Metric, MetricBatch, timestamp_now
+from nwkatk_netmon.health import DeviceCircuit
+
+if TYPE_CHECKING:
+    from nwkatk_netmon.exporters import ExporterBase
+    from nwkatk_netmon.scheduler import TickScheduler
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["PipelineMonitor", "poll_phase", "poll_phases"]
+
+
+# the phase timings, in seconds, of the running collection; set by the
+# CollectorExecutor for each poll, see `poll_phase`.
+
+poll_phases = ContextVar("poll_phases", default=None)
+
+
+@contextmanager
+def poll_phase(phase: str):
+    """
+    Add the time spent in the block to the phase of the running collection.  The
+    collectors use the "parse" phase for parsing the device responses and the
+    "build" phase for creating the metrics; the rest of the poll time is
+    accounted as the device RPC time.
+    """
+    if (phases := poll_phases.get()) is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - start
+
+
+# -----------------------------------------------------------------------------
+#
+#                              Metrics
+#
+# -----------------------------------------------------------------------------
+
+_Flag = conint(ge=0, le=1)
+
+
+@dataclass
+class NetmonPollLatencyMetric(Metric):
+    value: float
+    name: str = "netmon_poll_latency"
+
+
+@dataclass
+class NetmonPollQueueWaitMetric(Metric):
+    value: float
+    name: str = "netmon_poll_queue_wait"
+
+
+@dataclass
+class NetmonPollRpcTimeMetric(Metric):
+    value: float
+    name: str = "netmon_poll_rpc_time"
+
+
+@dataclass
+class NetmonPollParseTimeMetric(Metric):
+    value: float
+    name: str = "netmon_poll_parse_time"
+
+
+@dataclass
+class NetmonPollBuildTimeMetric(Metric):
+    value: float
+    name: str = "netmon_poll_build_time"
+
+
+@dataclass
+class NetmonPollMetricsMetric(Metric):
+    value: int
+    name: str = "netmon_poll_metrics"
+
+
+@dataclass
+class NetmonPollFailedMetric(Metric):
+    value: _Flag
+    name: str = "netmon_poll_failed"
+
+
+@dataclass
+class NetmonExportLatencyMetric(Metric):
+    value: float
+    name: str = "netmon_export_latency"
+
+
+@dataclass
+class NetmonExportBatchSamplesMetric(Metric):
+    value: float
+    name: str = "netmon_export_batch_samples"
+
+
+@dataclass
+class NetmonExportQueueDepthMetric(Metric):
+    value: int
+    name: str = "netmon_export_queue_depth"
+
+
+@dataclass
+class NetmonExportCounterMetric(Metric):
+    value: float
+    name: str = "netmon_export_total"
+
+
+@dataclass
+class NetmonSchedulerLateTicksMetric(Metric):
+    value: int
+    name: str = "netmon_scheduler_late_ticks"
+
+
+@dataclass
+class NetmonSchedulerMissedTicksMetric(Metric):
+    value: int
+    name: str = "netmon_scheduler_missed_ticks"
+
+
+@dataclass
+class NetmonSchedulerLatenessMetric(Metric):
+    value: float
+    name: str = "netmon_scheduler_lateness_max"
+
+
+@dataclass
+class NetmonPollTimeoutsMetric(Metric):
+    value: int
+    name: str = "netmon_poll_timeouts"
+
+
+@dataclass
+class NetmonPollSkippedMetric(Metric):
+    value: int
+    name: str = "netmon_poll_skipped"
+
+
+@dataclass
+class NetmonDevicesMetric(Metric):
+    value: int
+    name: str = "netmon_devices"
+
+
+@dataclass
+class NetmonLoopLagMetric(Metric):
+    value: float
+    name: str = "netmon_loop_lag_max"
+
+
+# -----------------------------------------------------------------------------
+#
+#                              Pipeline Monitor
+#
+# -----------------------------------------------------------------------------
+
+
+class NetmonHost(object):
+    """ the pseudo-device whose tags are bound to the process metrics """
+
+    def __init__(self):
+        self.name = "netmon"
+        self.tags = {"netmon_host": socket.gethostname()}
+
+
+class PipelineMonitor(object):
+    """
+    The PipelineMonitor produces the netmon self-instrumentation metrics.
+
+    Parameters
+    ----------
+    scheduler:
+        The scheduler running the collections, for the tick lateness.
+
+    exporters:
+        The exporters, for the export latency, batch size, queue depth and
+        counters.
+
+    circuits:
+        The device circuits, by device name, for the number of devices in each
+        health state.
+
+    loop_lag_interval:
+        The interval, in seconds, at which the event loop lag is sampled.
+    """
+
+    def __init__(
+        self,
+        scheduler: "TickScheduler",
+        exporters: List["ExporterBase"],
+        circuits: Dict[str, "DeviceCircuit"],
+        loop_lag_interval: float = 0.25,
+    ):
+        self.scheduler = scheduler
+        self.exporters = exporters
+        self.circuits = circuits
+        self.loop_lag_interval = loop_lag_interval
+        self.host = NetmonHost()
+        self._loop_lag_max = 0.0
+        self._loop_lag_task: Optional[asyncio.Task] = None
+        self._export_marks: Dict[str, tuple] = dict()
+
+    def start(self):
+        """ start the event loop lag sampling task """
+        if not self._loop_lag_task:
+            self._loop_lag_task = asyncio.create_task(self._sample_loop_lag())
+
+    def add_poll_metrics(
+        self,
+        metrics: Optional[MetricBatch],
+        collector: str,
+        latency: float,
+        queue_wait: float,
+        phases: Dict[str, float],
+        failed: bool,
+    ) -> MetricBatch:
+        """
+        Add the poll metrics to the device metrics batch, creating the batch if
+        the poll did not produce one.
+
+        Returns
+        -------
+        The metrics batch.
+        """
+        if metrics is None:
+            metrics = MetricBatch()
+
+        count = len(metrics)
+        parse_time = phases.get("parse", 0.0)
+        build_time = phases.get("build", 0.0)
+        rpc_time = max(latency - parse_time - build_time, 0.0)
+
+        tags_id = metrics.add_tags({"collector": collector})
+        ts = timestamp_now()
+
+        for metric_cls, value in (
+            (NetmonPollLatencyMetric, latency),
+            (NetmonPollQueueWaitMetric, queue_wait),
+            (NetmonPollRpcTimeMetric, rpc_time),
+            (NetmonPollParseTimeMetric, parse_time),
+            (NetmonPollBuildTimeMetric, build_time),
+            (NetmonPollMetricsMetric, count),
+            (NetmonPollFailedMetric, int(failed)),
+        ):
+            metrics.append(metric_cls, value, tags_id=tags_id, ts=ts)
+
+        return metrics
+
+    def process_metrics(self) -> MetricBatch:
+        """
+        returns the batch of the exporter, scheduler and event loop metrics; the
+        latency and batch size are the averages since the previous call.
+        """
+        metrics = MetricBatch()
+        ts = timestamp_now()
+
+        for exporter in self.exporters:
+            self._add_exporter_metrics(metrics, exporter, ts)
+
+        # the counters are the scheduler running totals, rather than the sums
+        # of the scheduled jobs, so that they do not drop while jobs are paused.
+
+        jobs, totals = self.scheduler.jobs, self.scheduler.stats
+        tags_id = metrics.add_tags({})
+        for metric_cls, value in (
+            (NetmonSchedulerLateTicksMetric, totals["late"]),
+            (NetmonSchedulerMissedTicksMetric, totals["missed"]),
+            (NetmonSchedulerLatenessMetric, max((j.lateness for j in jobs), default=0)),
+            (NetmonPollTimeoutsMetric, totals["timeouts"]),
+            (NetmonPollSkippedMetric, totals["skipped"]),
+            (NetmonLoopLagMetric, self._loop_lag_max),
+        ):
+            metrics.append(metric_cls, value, tags_id=tags_id, ts=ts)
+
+        states = Counter(circuit.state for circuit in self.circuits.values())
+        for state in DeviceCircuit.STATES:
+            state_tags_id = metrics.add_tags({"state": state})
+            metrics.append(NetmonDevicesMetric, states[state], state_tags_id, ts=ts)
+
+        self._loop_lag_max = 0.0
+        return metrics
+
+    def _add_exporter_metrics(self, metrics: MetricBatch, exporter, ts: int):
+        stats = exporter.stats
+        tags_id = metrics.add_tags({"exporter": exporter.name})
+
+        # the latency includes the failed batches, the batch size only the
+        # exported batches.
+
+        exported = stats["exported_batches"]
+        marks = (exported + stats["failed_batches"], stats["export_seconds"])
+        marks += (exported, stats["exported_samples"])
+        prev_marks = self._export_marks.get(exporter.name, (0, 0.0, 0, 0))
+        self._export_marks[exporter.name] = marks
+
+        batches, seconds, exported, samples = (
+            mark - prev_mark for mark, prev_mark in zip(marks, prev_marks)
+        )
+
+        if batches:
+            metrics.append(
+                NetmonExportLatencyMetric, seconds / batches, tags_id, ts=ts
+            )
+
+        if exported:
+            metrics.append(
+                NetmonExportBatchSamplesMetric, samples / exported, tags_id, ts=ts
+            )
+
+        queue_depth = exporter.batcher.queue_depth if exporter.batcher else 0
+        metrics.append(NetmonExportQueueDepthMetric, queue_depth, tags_id, ts=ts)
+
+        for counter, value in stats.items():
+            counter_tags_id = metrics.add_tags(
+                {"exporter": exporter.name, "counter": counter}
+            )
+            metrics.append(NetmonExportCounterMetric, value, counter_tags_id, ts=ts)
+
+    async def _sample_loop_lag(self):
+        # the lag is how much later than requested the sleep returns; which is
+        # the time that other callbacks held the event loop.
+
+        loop = asyncio.get_event_loop()
+        interval = self.loop_lag_interval
+
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lag = loop.time() - start - interval
+            self._loop_lag_max = max(self._loop_lag_max, lag)
@@ -0,0 +1,201 @@
+#     Copyright 2020, Jeremy Schulman
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+This file contains the concurrency limiters used to bound the number of
+in-flight device requests.  Waiters are queued per device and the queues are
+served round-robin so that a device with many collectors cannot starve the
+other devices.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Dict, Hashable, Optional, TYPE_CHECKING
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+import asyncio
+import time
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon.log import log
+
+if TYPE_CHECKING:
+    from nwkatk_netmon.drivers import DriverBase
+    from nwkatk_netmon.config_model import ConcurrencyModel
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["FairLimiter", "PollLimiter"]
+
+
+class FairLimiter(object):
+    """
+    The FairLimiter allows at most `limit` holders at a time.  When the limit is
+    reached the waiters are queued by key, and when a slot is released the next
+    waiter is taken from the key queues in round-robin order.
+
+    Parameters
+    ----------
+    name:
+        The limiter name, used for logging.
+
+    limit:
+        The maximum number of concurrent holders.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.inflight = 0
+        self._queues: Dict[Hashable, deque] = OrderedDict()
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(waiters) for waiters in self._queues.values())
+
+    async def acquire(self, key: Hashable) -> float:
+        """
+        Acquire a slot, waiting in the queue for the key if the limit has been
+        reached.
+
+        Returns
+        -------
+        The time, in seconds, spent waiting in the queue.
+        """
+        if self.inflight < self.limit and not self._queues:
+            self.inflight += 1
+            return 0.0
+
+        start = time.monotonic()
+        waiter = asyncio.get_event_loop().create_future()
+        self._queues.setdefault(key, deque()).append(waiter)
+
+        try:
+            await waiter
+
+        except asyncio.CancelledError:
+            # if the slot was handed to this waiter at the same time that it was
+            # cancelled, then pass the slot along to the next waiter.
+
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._discard(key, waiter)
+            raise
+
+        return time.monotonic() - start
+
+    def release(self):
+        """ release a slot, handing it to the next queued waiter if any """
+        while self._queues:
+            key, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+
+            # move the key to the end of the queues so that the next released
+            # slot goes to a different key.
+
+            del self._queues[key]
+            if waiters:
+                self._queues[key] = waiters
+
+            if not waiter.done():
+                # the slot count does not change; it is handed to the waiter.
+                waiter.set_result(None)
+                return
+
+        self.inflight -= 1
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable):
+        wait_time = await self.acquire(key)
+        try:
+            yield wait_time
+        finally:
+            self.release()
+
+    def _discard(self, key, waiter):
+        if (waiters := self._queues.get(key)) is None:
+            return
+
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            pass
+
+        if not waiters:
+            del self._queues[key]
+
+
+class PollLimiter(object):
+    """
+    The PollLimiter combines the limiters that bound the device requests: a
+    global limit on all in-flight device requests, a limit on the concurrent
+    device logins, and optional limits per device driver (os_name).  The queue
+    wait time for each device is recorded so that it can be observed.
+
+    Parameters
+    ----------
+    config:
+        The concurrency configuration from the netmon config defaults.
+    """
+
+    def __init__(self, config: "ConcurrencyModel"):
+        self.requests = FairLimiter("requests", config.max_inflight)
+        self.logins = FairLimiter("logins", config.max_logins)
+        self.drivers = {
+            os_name: FairLimiter(f"driver:{os_name}", limit)
+            for os_name, limit in config.drivers.items()
+        }
+
+        # the most recent queue wait time, in seconds, per device name
+        self.queue_wait: Dict[str, float] = dict()
+
+    @asynccontextmanager
+    async def poll(self, device: "DriverBase"):
+        """ hold a device request slot for the duration of a collection """
+        async with self._slots(device, self.drivers.get(device.os_name)):
+            yield
+
+    @asynccontextmanager
+    async def login(self, device: "DriverBase"):
+        """ hold a login slot, and a device request slot, for the device login """
+        async with self._slots(device, self.logins):
+            yield
+
+    @asynccontextmanager
+    async def _slots(self, device: "DriverBase", limiter: Optional[FairLimiter]):
+        wait_time = 0.0
+        key = device.name
+
+        if limiter:
+            wait_time += await limiter.acquire(key)
+
+        try:
+            async with self.requests.slot(key) as request_wait:
+                wait_time += request_wait
+                self.queue_wait[key] = wait_time
+                if wait_time:
+                    log.debug(f"{device.name}: waited {wait_time:.3f}s for a slot")
+                yield
+
+        finally:
+            if limiter:
+                limiter.release()
@@ -0,0 +1,360 @@
+#     Copyright 2020, Jeremy Schulman
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+This file contains the tick scheduler used to run the interval based
+collectors.  All jobs are kept in a single heap ordered by their next due time.
+The due times are absolute and aligned to the interval, so that the period of a
+job does not drift by the time it takes to run.  Each job is given a
+deterministic offset within the interval, based on the job name, so that the
+load of many devices is spread across the interval rather than firing in
+lockstep.  The offset only applies to the time the job fires: the tick
+timestamp of a run is the interval boundary, so that the metric timestamps of
+all the devices line up.
+
+A job can be given a lead time, so that it fires that much ahead of its tick;
+the tick timestamp of the run is still the aligned tick time.  The collectors
+use the device poll latency as the lead, so that a poll completes near its
+tick time.
+
+The interval of a job can be changed while it is scheduled, see `reschedule`;
+the job then fires on the aligned ticks of the new interval.
+
+A job runs at most once at a time: if the previous run of the job is still in
+progress when the job is due, the tick is skipped.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Callable, Awaitable, List, Optional, Set, Tuple
+import asyncio
+import heapq
+import time
+import zlib
+from itertools import count
+from collections import Counter
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon import tick_timestamp
+from nwkatk_netmon.log import log
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["TickScheduler", "ScheduledJob"]
+
+
+class ScheduledJob(object):
+    """
+    A ScheduledJob is an interval based coroutine function managed by the
+    TickScheduler.  The job tracks the tick counters that are used to report on
+    late and missed ticks.
+
+    Attributes
+    ----------
+    name: str
+        The job name, used to determine the offset within the interval.
+
+    interval: float
+        The job interval in seconds.
+
+    offset: float
+        The job offset within the interval in seconds.
+
+    tick: float
+        The interval boundary time of the scheduled tick, that is the due time
+        less the offset.
+
+    lead: float
+        The time, in seconds, that the job fires ahead of its tick; at most a
+        quarter of the interval.
+
+    ticks: int
+        The number of ticks that have been fired.
+
+    late: int
+        The number of ticks that fired later than the scheduler late threshold.
+
+    missed: int
+        The number of ticks that were skipped because the scheduler was more
+        than one interval late.
+
+    lateness: float
+        The lateness, in seconds, of the most recent tick.
+
+    skipped: int
+        The number of ticks that were skipped because the previous run of the
+        job was still in progress.
+
+    timeouts: int
+        The number of runs that were cancelled because they exceeded their
+        deadline; counted by the job coroutine, see CollectorExecutor and
+        `TickScheduler.count_timeout`.
+    """
+
+    def __init__(self, name: str, interval: float, coro: Callable[[], Awaitable]):
+        self.name = name
+        self.interval = interval
+        self.offset = stagger_offset(name, interval)
+        self.coro = coro
+        self.due = 0.0
+        self.tick = 0.0
+        self.fire_at = 0.0
+        self._lead = 0.0
+        self.ticks = 0
+        self.late = 0
+        self.missed = 0
+        self.lateness = 0.0
+        self.skipped = 0
+        self.timeouts = 0
+        self.running = False
+        self.cancelled = False
+        self.scheduled = False
+
+    @property
+    def lead(self) -> float:
+        return self._lead
+
+    @lead.setter
+    def lead(self, value: float):
+        self._lead = min(max(value, 0.0), self.interval / 4)
+
+    def next_due(self, now: float) -> float:
+        """ returns the first aligned tick time that is after `now` """
+        periods = (now - self.offset) // self.interval + 1
+        return periods * self.interval + self.offset
+
+    def cancel(self):
+        """ stop the job; it will be removed from the scheduler at the next tick """
+        self.cancelled = True
+
+    def __str__(self):
+        return self.name
+
+
+def stagger_offset(name: str, interval: float) -> float:
+    """
+    Returns the deterministic offset, in seconds, within the interval for the
+    given job name.  The same job name always gets the same offset so that the
+    series of a device are evenly spaced across restarts.
+    """
+    millis = int(interval * 1000)
+    return (zlib.crc32(name.encode()) % millis) / 1000 if millis else 0.0
+
+
+class TickScheduler(object):
+    """
+    The TickScheduler fires each job on absolute, aligned, ticks.  When a job
+    fires the scheduled tick time is set in the `tick_timestamp` context variable
+    so that the collector metric timestamps line up across devices.
+
+    Parameters
+    ----------
+    late_threshold:
+        The number of seconds after the due time that a tick is considered late.
+
+    Attributes
+    ----------
+    stats: Counter
+        The running totals of the "late", "missed" and "skipped" ticks, and the
+        "timeouts", of all the jobs; including the jobs that are paused or were
+        removed.
+    """
+
+    def __init__(self, late_threshold: float = 1.0):
+        self.late_threshold = late_threshold
+        self.stats = Counter()
+        # the heap entries are ordered by the job fire time, the due time less
+        # the lead time at the time the job is pushed.
+
+        self._heap: List[Tuple[float, int, ScheduledJob]] = list()
+        self._seq = count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # the running job tasks, so that they are not garbage collected.
+
+        self._running: Set[asyncio.Task] = set()
+
+    def add_job(
+        self, name: str, interval: float, coro: Callable[[], Awaitable]
+    ) -> ScheduledJob:
+        """
+        Add the coroutine function to the scheduler so that it is called every
+        interval seconds.  The scheduler task is started if it is not already
+        running.
+
+        Parameters
+        ----------
+        name:
+            The job name, should be unique, for example "<device>:<collector>".
+
+        interval:
+            The job interval in seconds.
+
+        coro:
+            The coroutine function, called without arguments, on each tick.
+        """
+        job = ScheduledJob(name=name, interval=interval, coro=coro)
+        self._push(job, job.next_due(time.time()))
+
+        if not self._task:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+        else:
+            self._wakeup.set()
+
+        log.debug(f"{name}: scheduled every {interval}s at offset {job.offset:.3f}s")
+        return job
+
+    def reschedule(self, job: ScheduledJob, interval: float):
+        """
+        Change the job interval.  The job fires at the next aligned tick of the
+        new interval if that is sooner than its scheduled tick; otherwise the
+        new interval applies after the scheduled tick.
+        """
+        job.interval = interval
+        job.offset = stagger_offset(job.name, interval)
+
+        # apply the lead limit of the new interval.
+        job.lead = job.lead
+
+        if job.cancelled or not job.scheduled:
+            return
+
+        # the heap entry of the scheduled tick is superseded, and skipped when
+        # it is popped.
+
+        if (due := job.next_due(time.time())) < job.due:
+            self._push(job, due)
+            self._wakeup.set()
+
+    def count_timeout(self, job: ScheduledJob):
+        """ count a run of the job that exceeded its deadline """
+        job.timeouts += 1
+        self.stats["timeouts"] += 1
+
+    def resume(self, job: ScheduledJob):
+        """ resume the cancelled job, at its next aligned tick """
+        job.cancelled = False
+
+        # the job is still in the heap if it was resumed before its next tick.
+
+        if not job.scheduled:
+            self._push(job, job.next_due(time.time()))
+            self._wakeup.set()
+
+    @property
+    def jobs(self) -> List[ScheduledJob]:
+        return [job for fire_at, _, job in self._heap if fire_at == job.fire_at]
+
+    async def run(self):
+        """ the scheduler task, fires the jobs when they are due """
+        while True:
+            if not self._heap:
+                await self._wait(None)
+                continue
+
+            fire_at, _, job = self._heap[0]
+            if (delay := fire_at - time.time()) > 0:
+                await self._wait(delay)
+                continue
+
+            heapq.heappop(self._heap)
+            if fire_at != job.fire_at:
+                continue
+
+            job.scheduled = False
+            if job.cancelled:
+                continue
+
+            self._fire(job, fire_at)
+
+    def _fire(self, job: ScheduledJob, fire_at: float):
+        due, tick = job.due, job.tick
+        lateness = time.time() - fire_at
+
+        # if the scheduler is more than an interval late, for example the loop
+        # was blocked, then skip the missed ticks rather than firing them in a
+        # burst.
+
+        if lateness >= job.interval:
+            missed = int(lateness // job.interval)
+            job.missed += missed
+            self.stats["missed"] += missed
+            due += missed * job.interval
+            tick += missed * job.interval
+            lateness -= missed * job.interval
+            log.warning(f"{job.name}: missed {missed} scheduled tick(s)")
+
+        if lateness > self.late_threshold:
+            job.late += 1
+            self.stats["late"] += 1
+            log.warning(f"{job.name}: tick late by {lateness:.3f}s")
+
+        # the next tick is computed from the interval alignment, rather than
+        # by adding the interval, in case the interval was changed.
+
+        job.lateness = lateness
+        self._push(job, job.next_due(due + job.interval / 2))
+
+        if job.running:
+            job.skipped += 1
+            self.stats["skipped"] += 1
+            log.warning(f"{job.name}: previous run still in progress, tick skipped")
+            return
+
+        job.ticks += 1
+        job.running = True
+        task = asyncio.create_task(self._run_job(job, tick_ts=round(tick * 1000)))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    @staticmethod
+    async def _run_job(job: ScheduledJob, tick_ts: int):
+        # the task runs in its own context, so setting the tick timestamp here
+        # does not affect other jobs.
+        tick_timestamp.set(tick_ts)
+        try:
+            await job.coro()
+
+        except Exception as exc:  # noqa
+            exc_name = exc.__class__.__name__
+            log.error(f"{job.name}: job failed: {exc_name}: {exc}")
+
+        finally:
+            job.running = False
+
+    def _push(self, job: ScheduledJob, due: float):
+        # the tick is recorded with the due time, since a reschedule changes
+        # the offset of the following ticks.
+
+        job.due = due
+        job.tick = due - job.offset
+        job.fire_at = due - job.lead
+        job.scheduled = True
+        heapq.heappush(self._heap, (job.fire_at, next(self._seq), job))
+
+    async def _wait(self, timeout: Optional[float]):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
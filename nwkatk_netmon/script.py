@@ -16,7 +16,10 @@
 # System Imports
 # -----------------------------------------------------------------------------
 
+from typing import Dict, List, Optional
 import sys
+import signal
+import socket
 import asyncio
 from importlib import metadata
 from functools import update_wrapper
@@ -32,11 +35,19 @@ from nwkatk.cli.inventory import opts_inventory, pass_inventory_records
 # Private Imports
 # -----------------------------------------------------------------------------
 
-from nwkatk_netmon.config import load_config_file
+from nwkatk_netmon.config import load_config_file, get_config_data
 from nwkatk_netmon.config_model import ConfigModel
 from nwkatk_netmon.log import log
 
 from nwkatk_netmon.collectors import CollectorExecutor
+from nwkatk_netmon.exporters import ExporterBase
+from nwkatk_netmon.workers import Supervisor, PayloadForwarder, partition_records
+from nwkatk_netmon.sharding import shard_records
+from nwkatk_netmon.eventloop import new_event_loop
+
+# the time a worker waits for its exporters to forward the queued batches when
+# terminated, less than the supervisor stop timeout.
+WORKER_DRAIN_TIMEOUT = 20.0
 
 VERSION = metadata.version(__package__)
 
@@ -53,15 +64,11 @@ async def async_main_device(executor, inventory_rec, config: ConfigModel):
         return
 
     device = config.device_drivers[os_name].driver(name=device_name)
-    creds = config.defaults.credentials
+    device.prepare(inventory_rec=inventory_rec, config=config)
 
-    try:
-        device.prepare(inventory_rec=inventory_rec, config=config)
-        await device.login(creds=creds)
+    # the login is retried, with backoff, until the device is reachable.
 
-    except RuntimeError:
-        log.error(f"{device_name}: failed to authenticate to device, skipping.")
-        return
+    await executor.login(device)
 
     # TODO: filter options to not copy all tag values
     #       ....
@@ -73,6 +80,88 @@ async def async_main_device(executor, inventory_rec, config: ConfigModel):
         await c_start(device, executor=executor, config=c_config)
 
 
+def run_collectors(
+    config: ConfigModel, inventory_records: List[Dict], worker: Optional[int] = None
+):
+    """
+    Run the collectors of the inventory devices until terminated; `worker` is
+    the worker index when running in a worker process.
+    """
+    executor = CollectorExecutor(config=config)
+
+    if worker is not None and executor.monitor:
+        executor.monitor.host.tags["netmon_worker"] = str(worker)
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(executor.start_exporters())
+
+    for rec in inventory_records:
+        loop.create_task(async_main_device(executor, rec, config=config))
+
+    # on terminate, write any unsent metrics to the exporter spools before
+    # stopping.  When the payloads are forwarded to the supervisor, the queued
+    # batches are exported first; the supervisor spools them if need be.
+
+    if any(exporter.forwarder for exporter in executor.exporters):
+        loop.add_signal_handler(
+            signal.SIGTERM,
+            lambda: loop.create_task(executor.drain(timeout=WORKER_DRAIN_TIMEOUT)),
+        )
+    else:
+        loop.add_signal_handler(signal.SIGTERM, executor.shutdown)
+
+    loop.run_forever()
+
+
+def run_worker(
+    index: int,
+    inventory_records: List[Dict],
+    forward_sock: Optional[socket.socket],
+    config_data: dict,
+    interval: Optional[int],
+    log_level: str,
+    loop_type: Optional[str],
+):
+    """
+    The worker process function, see nwkatk_netmon.workers.Supervisor.  The
+    worker re-creates the config, and so its own device drivers, collectors
+    and exporters, from the config file data.
+    """
+
+    # the supervisor handles the terminal interrupt, and terminates the workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    log.setLevel(log_level.upper())
+
+    config = ConfigModel.parse_obj(config_data)
+    if interval:
+        config.defaults.interval = interval
+
+    forwarder = None
+    loop = new_event_loop(config.defaults.loop, loop_type)
+
+    if forward_sock:
+        forwarder = PayloadForwarder(forward_sock)
+        loop.run_until_complete(forwarder.connect())
+
+    for exporter in config.exporters.values():
+        exporter.setup_worker(index, forwarder)
+
+    run_collectors(config, inventory_records, worker=index)
+
+
+def push_exporters(config: ConfigModel) -> List[ExporterBase]:
+    """ returns the configured exporters that push payloads, see ExporterBase """
+    exporters = config.exporters
+    return [
+        exporter
+        for exporter in (
+            exporters[e_name] for e_name in config.defaults.exporters or exporters
+        )
+        if type(exporter).export_batch is ExporterBase.export_batch
+        and not exporter.exports_metrics
+    ]
+
+
 # -----------------------------------------------------------------------------
 
 
@@ -95,6 +184,39 @@ def map_config_inventory(f):
     return update_wrapper(mapper, f)
 
 
+def shard_inventory_records(f):
+    """
+    This decorator filters the inventory records, loaded by the standard nwkatk
+    inventory loader, to the devices of this netmon instance shard; the shard
+    options override the config defaults.sharding values.
+    """
+
+    @click.pass_context
+    def sharder(ctx, inventory_records, **kwargs):
+        sharding = kwargs["config"].defaults.sharding
+        if (index := kwargs["shard_index"]) is None:
+            index = sharding.index
+        if (count := kwargs["shard_count"]) is None:
+            count = sharding.count
+
+        if index >= count:
+            raise click.BadParameter(
+                f"shard index {index} must be less than shard count {count}",
+                param_hint="--shard-index",
+            )
+
+        records = shard_records(inventory_records, index=index, count=count)
+        if count > 1:
+            log.info(
+                f"shard {index} of {count}: "
+                f"{len(records)} of {len(inventory_records)} devices"
+            )
+
+        return ctx.invoke(f, inventory_records=records, **kwargs)
+
+    return update_wrapper(sharder, f)
+
+
 @click.command()
 @click.version_option(version=VERSION)
 @click.option(
@@ -116,23 +238,57 @@ def map_config_inventory(f):
     default="info",
     callback=set_log_level,
 )
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    help="number of worker processes the devices are partitioned across",
+)
+@click.option(
+    "--aggregate",
+    is_flag=True,
+    help="export the worker payloads through the supervisor connections",
+)
+@click.option(
+    "--shard-index",
+    type=click.IntRange(min=0),
+    help="shard of this instance, see --shard-count",
+)
+@click.option(
+    "--shard-count",
+    type=click.IntRange(min=1),
+    help="number of instances the devices are sharded across",
+)
+@click.option(
+    "--loop",
+    type=click.Choice(["asyncio", "uvloop"]),
+    help="event loop, overrides the config defaults.loop.type",
+)
 @map_config_inventory
 @pass_inventory_records
+@shard_inventory_records
 def cli_netifdom(inventory_records, config, **kwargs):
+    new_event_loop(config.defaults.loop, kwargs["loop"])
 
-    if interval := kwargs["interval"]:
-        config.defaults.interval = interval
+    if (workers := kwargs["workers"]) == 1:
+        if interval := kwargs["interval"]:
+            config.defaults.interval = interval
 
-    # Start each collector on the device
-    executor = CollectorExecutor(config=config)
-
-    loop = asyncio.get_event_loop()
-    # loop.run_until_complete(async_main_exporters(config=config))
-
-    for rec in inventory_records:
-        loop.create_task(async_main_device(executor, rec, config=config))
+        run_collectors(config, inventory_records)
+        return
 
-    loop.run_forever()
+    supervisor = Supervisor(
+        target=run_worker,
+        partitions=partition_records(inventory_records, workers),
+        args=(
+            get_config_data(),
+            kwargs["interval"],
+            kwargs["log_level"],
+            kwargs["loop"],
+        ),
+        exporters=push_exporters(config) if kwargs["aggregate"] else None,
+    )
+    supervisor.run()
 
 
 def main():
@@ -0,0 +1,221 @@
+#     Copyright 2020, Jeremy Schulman
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+This file contains the series registry that is shared by the collectors and the
+exporters.  A series is the combination of the device tags, the metric name, and
+the metric tags.  Each unique tag-set and series is interned into a stable
+integer id so that the exporters can pre-render, and cache, the series key in
+their specific output format.  Since the ids are based on the tag values, when
+the tags change a new id is created; and so the cached keys are only rendered
+again when the tags actually change.
+
+The tag-sets and series that are no longer collected, for example after an
+interface is removed or its description is changed, are released by `sweep`;
+which the CollectorExecutor calls periodically.  A released id, and its cached
+keys, are dropped and the id is re-used by a new series; the exporters that
+keep state by series id register a release hook, see `add_release_hook`, to
+drop that state.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Dict, List, Tuple, Mapping, Callable, Optional, Any
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["SeriesRegistry", "series_registry"]
+
+
+TagItems = Tuple[Tuple[str, Any], ...]
+SeriesRenderer = Callable[[str, TagItems], Any]
+ReleaseHook = Callable[[List[int]], None]
+
+
+class SeriesRegistry(object):
+    """
+    The SeriesRegistry interns tag-sets and series into integer ids, and caches
+    the exporter specific series keys.
+
+    Examples
+    --------
+    An exporter registers a key format once:
+
+        influxdb_key = series_registry.key_format("influxdb", render_influxdb)
+
+    and then obtains the pre-rendered key for each sample:
+
+        line = f"{influxdb_key(series_id)} value={value}"
+    """
+
+    def __init__(self):
+        self._tagsets_index: Dict[TagItems, int] = dict()
+        self._tagsets: List[Optional[TagItems]] = list()
+        self._tagsets_dict: List[Optional[Dict]] = list()
+        self._tagsets_seen: List[int] = list()
+        self._tagsets_free: List[int] = list()
+
+        self._series_index: Dict[Tuple[int, str, int], int] = dict()
+        self._series: List[Optional[Tuple[int, str, int]]] = list()
+        self._series_seen: List[int] = list()
+        self._series_free: List[int] = list()
+
+        self._keys: Dict[str, Dict[int, Any]] = dict()
+        self._release_hooks: List[ReleaseHook] = list()
+
+        # the sweep generation; each id records the generation it was last used.
+        self.generation = 0
+
+    def intern_tags(self, tags: Mapping) -> int:
+        """ returns the tag-set id for the given tags mapping """
+        items = tuple(tags.items())
+        if (tags_id := self._tagsets_index.get(items)) is None:
+            if self._tagsets_free:
+                tags_id = self._tagsets_free.pop()
+                self._tagsets[tags_id] = items
+                self._tagsets_dict[tags_id] = dict(items)
+            else:
+                tags_id = len(self._tagsets)
+                self._tagsets.append(items)
+                self._tagsets_dict.append(dict(items))
+                self._tagsets_seen.append(0)
+
+            self._tagsets_index[items] = tags_id
+
+        self._tagsets_seen[tags_id] = self.generation
+        return tags_id
+
+    def tags(self, tags_id: int) -> Dict:
+        """ returns the tags mapping for the tag-set id; do not modify """
+        return self._tagsets_dict[tags_id]
+
+    def intern_series(self, device_tags_id: int, name: str, tags_id: int) -> int:
+        """
+        returns the series id for the combination of device tag-set id, metric
+        name, and metric tag-set id.
+        """
+        key = (device_tags_id, name, tags_id)
+        if (series_id := self._series_index.get(key)) is None:
+            if self._series_free:
+                series_id = self._series_free.pop()
+                self._series[series_id] = key
+            else:
+                series_id = len(self._series)
+                self._series.append(key)
+                self._series_seen.append(0)
+
+            self._series_index[key] = series_id
+
+        self._series_seen[series_id] = self.generation
+        return series_id
+
+    def series(self, series_id: int) -> Tuple[str, TagItems]:
+        """ returns the metric name and all tag items (device + metric) """
+        device_tags_id, name, tags_id = self._series[series_id]
+        return name, self._tagsets[device_tags_id] + self._tagsets[tags_id]
+
+    def key_format(self, fmt: str, render: SeriesRenderer) -> Callable[[int], Any]:
+        """
+        Registers an exporter key format, and returns the function used to
+        obtain the cached series key for a given series id.
+
+        Parameters
+        ----------
+        fmt:
+            The unique name of the key format, for example "influxdb".
+
+        render:
+            The function called with (name, tag_items) to render the series key
+            the first time the series id is used.
+        """
+        keys = self._keys.setdefault(fmt, dict())
+        series = self.series
+
+        def series_key(series_id: int):
+            try:
+                return keys[series_id]
+            except KeyError:
+                key = keys[series_id] = render(*series(series_id))
+                return key
+
+        return series_key
+
+    def add_release_hook(self, hook: ReleaseHook):
+        """
+        Register the function called with the list of series ids released by
+        `sweep`, before the ids are re-used.
+        """
+        self._release_hooks.append(hook)
+
+    def sweep(self) -> int:
+        """
+        Release the series, and tag-sets, that were not used since the previous
+        sweep; and start a new generation.  The sweep period must be longer than
+        the time a collected batch waits to be exported, so that the ids of the
+        queued batches are not released.
+
+        Returns
+        -------
+        The number of series released.
+        """
+        expired = self.generation
+        self.generation += 1
+
+        released = [
+            series_id
+            for series_id, seen in enumerate(self._series_seen)
+            if seen < expired and self._series[series_id] is not None
+        ]
+
+        if released:
+            for hook in self._release_hooks:
+                hook(released)
+
+            for keys in self._keys.values():
+                for series_id in released:
+                    keys.pop(series_id, None)
+
+            for series_id in released:
+                del self._series_index[self._series[series_id]]
+                self._series[series_id] = None
+
+            self._series_free.extend(released)
+
+        # the tag-sets of the remaining series are kept, even if not used.
+
+        in_use = set()
+        for key in self._series_index:
+            in_use.add(key[0])
+            in_use.add(key[2])
+
+        for tags_id, seen in enumerate(self._tagsets_seen):
+            if seen < expired and tags_id not in in_use:
+                if (items := self._tagsets[tags_id]) is not None:
+                    del self._tagsets_index[items]
+                    self._tagsets[tags_id] = self._tagsets_dict[tags_id] = None
+                    self._tagsets_free.append(tags_id)
+
+        return len(released)
+
+    def __len__(self):
+        return len(self._series_index)
+
+
+# the registry shared by all collectors and exporters.
+
+series_registry = SeriesRegistry()
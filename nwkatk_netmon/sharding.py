@@ -0,0 +1,71 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the assignment of devices to shards, used to split the
+inventory across netmon instances, and across the worker processes of an
+instance.
+
+The device host name is assigned to a shard using the jump consistent hash,
+Lamping & Veach, "A Fast, Minimal Memory, Consistent Hash Algorithm".  When
+the shard count grows from N to N + 1 only about 1/(N + 1) of the devices move,
+all to the new shard; so that adding a netmon host does not re-shuffle the
+devices of the existing hosts.  The host name hash is computed with blake2b,
+rather than the builtin hash, so that every instance computes the same
+assignment.  The instance shards and the worker partitions of an instance use
+distinct hash namespaces, otherwise the devices of one instance shard would
+not be spread across its workers.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Dict, List
+import hashlib
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["shard_of", "shard_records"]
+
+
+_MASK64 = (1 << 64) - 1
+_JUMP_MULTIPLIER = 2862933555777941757
+
+
+def _host_key(host: str, namespace: bytes) -> int:
+    digest = hashlib.blake2b(host.encode(), digest_size=8, person=namespace).digest()
+    return int.from_bytes(digest, "big")
+
+
+def shard_of(host: str, count: int, namespace: bytes = b"netmon-shards") -> int:
+    """ returns the shard, 0 to count - 1, of the device host name """
+    key, shard, jump = _host_key(host, namespace), -1, 0
+
+    while jump < count:
+        shard = jump
+        key = (key * _JUMP_MULTIPLIER + 1) & _MASK64
+        jump = int((shard + 1) * ((1 << 31) / ((key >> 33) + 1)))
+
+    return shard
+
+
+def shard_records(records: List[Dict], index: int, count: int) -> List[Dict]:
+    """ returns the inventory records assigned to the shard index of count """
+    if count == 1:
+        return records
+
+    return [rec for rec in records if shard_of(rec["host"], count) == index]
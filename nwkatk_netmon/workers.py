@@ -0,0 +1,299 @@
+#  Copyright 2020, Jeremy Schulman
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This file contains the multi-process runtime.  The Supervisor partitions the
+inventory records across worker processes, each running its own event loop,
+device drivers, collectors and exporters, and restarts the workers that exit
+unexpectedly.
+
+Optionally the workers forward their encoded export payloads to the
+Supervisor, which delivers them through its own exporter connections; so that
+the TSDB sees one set of connections regardless of the number of workers.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Callable, Dict, List, Optional, Set
+import multiprocessing
+import asyncio
+import signal
+import socket
+import struct
+import time
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from nwkatk_netmon.log import log
+from nwkatk_netmon.exporters import ExporterBase
+from nwkatk_netmon.sharding import shard_of
+
+# -----------------------------------------------------------------------------
+# Exports
+# -----------------------------------------------------------------------------
+
+__all__ = ["Supervisor", "PayloadForwarder", "partition_records"]
+
+
+# the forwarded payload frame header: exporter name length, payload length
+_FRAME_HEADER = struct.Struct("!HI")
+
+# restart backoff of crashed workers; the backoff is reset once the worker has
+# been running for the reset period.
+_RESTART_DELAY_MIN = 1.0
+_RESTART_DELAY_MAX = 60.0
+_RESTART_DELAY_RESET = 60.0
+
+# the time given to the workers to drain their exports when stopping
+_STOP_TIMEOUT = 30.0
+
+
+def partition_records(records: List[Dict], count: int) -> List[List[Dict]]:
+    """
+    returns the inventory records partitioned into count lists, by consistent
+    hashing of the host name; see nwkatk_netmon.sharding.
+    """
+    partitions = [list() for _ in range(count)]
+    for rec in records:
+        worker = shard_of(rec["host"], count, namespace=b"netmon-workers")
+        partitions[worker].append(rec)
+
+    return partitions
+
+
+class PayloadForwarder(object):
+    """
+    The PayloadForwarder is used by an exporter in a worker process to forward
+    the encoded export payloads to the Supervisor; see ExporterBase.deliver.
+
+    Parameters
+    ----------
+    sock:
+        The worker end of the socket pair connected to the Supervisor.
+    """
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self):
+        _, self._writer = await asyncio.open_connection(sock=self.sock)
+
+    async def send(self, exporter_name: str, payload: bytes):
+        # each frame is written with a single write, and so the frames of
+        # concurrent export workers are not interleaved.
+
+        name = exporter_name.encode()
+        header = _FRAME_HEADER.pack(len(name), len(payload))
+        self._writer.write(header + name + payload)
+        await self._writer.drain()
+
+
+class Supervisor(object):
+    """
+    The Supervisor starts a worker process for each partition of the inventory
+    records, restarts the workers that exit unexpectedly, and on SIGTERM or
+    SIGINT stops the workers and waits for them to exit.
+
+    Parameters
+    ----------
+    target:
+        The worker process function, called as
+        target(index, records, forward_sock, *args); `forward_sock` is None
+        unless the payloads are aggregated.
+
+    partitions:
+        The inventory records of each worker.
+
+    args:
+        The additional target arguments, which must be picklable.
+
+    exporters:
+        When provided, the workers forward their export payloads and the
+        Supervisor delivers them using these exporters.
+    """
+
+    def __init__(
+        self,
+        target: Callable,
+        partitions: List[List[Dict]],
+        args: tuple = (),
+        exporters: Optional[List[ExporterBase]] = None,
+    ):
+        self.target = target
+        self.partitions = partitions
+        self.args = args
+        self.exporters = {exporter.name: exporter for exporter in exporters or []}
+        self.processes: Dict[int, multiprocessing.Process] = dict()
+
+        # the workers are spawned so that each starts from a clean interpreter,
+        # rather than a fork of the Supervisor event loop.
+
+        self._mp = multiprocessing.get_context("spawn")
+        self._stopping: Optional[asyncio.Event] = None
+        self._deliveries: Dict[str, asyncio.Semaphore] = dict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def run(self):
+        asyncio.get_event_loop().run_until_complete(self._run())
+
+    def stop(self):
+        if not self._stopping.is_set():
+            log.info("Supervisor: stopping workers")
+            self._stopping.set()
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        self._stopping = asyncio.Event()
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop)
+
+        for exporter in self.exporters.values():
+            self._deliveries[exporter.name] = asyncio.Semaphore(
+                exporter.batcher.workers
+            )
+            if exporter.spool:
+                exporter.batcher.start()
+
+        workers = [
+            asyncio.create_task(self._supervise(index))
+            for index in range(len(self.partitions))
+        ]
+
+        await self._stopping.wait()
+
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        _, pending = await asyncio.wait(workers, timeout=_STOP_TIMEOUT)
+        if pending:
+            for process in self.processes.values():
+                if process.is_alive():
+                    log.warning(f"Supervisor: killing worker pid {process.pid}")
+                    process.kill()
+            await asyncio.wait(pending)
+
+        # deliver the payloads that the workers forwarded before they exited,
+        # then spool any payloads still queued.
+
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+        for exporter in self.exporters.values():
+            exporter.batcher.stop()
+
+        log.info("Supervisor: stopped")
+
+    async def _supervise(self, index: int):
+        """ run the worker, restarting it with backoff if it exits unexpectedly """
+        delay = _RESTART_DELAY_MIN
+
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            process = self._start_worker(index)
+            await self._wait_exit(process)
+
+            if self._stopping.is_set():
+                break
+
+            if time.monotonic() - started > _RESTART_DELAY_RESET:
+                delay = _RESTART_DELAY_MIN
+
+            log.error(
+                f"Supervisor: worker {index} exited with code {process.exitcode}, "
+                f"restarting in {delay:.0f}s"
+            )
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+            delay = min(delay * 2, _RESTART_DELAY_MAX)
+
+        log.info(f"Supervisor: worker {index} stopped")
+
+    def _start_worker(self, index: int) -> multiprocessing.Process:
+        forward_sock = None
+
+        if self.exporters:
+            supervisor_sock, forward_sock = socket.socketpair()
+            self._add_task(self._receive(supervisor_sock))
+
+        process = self._mp.Process(
+            target=self.target,
+            name=f"netmon-worker-{index}",
+            args=(index, self.partitions[index], forward_sock) + self.args,
+        )
+        process.start()
+        self.processes[index] = process
+
+        if forward_sock:
+            forward_sock.close()
+
+        log.info(f"Supervisor: started worker {index}, pid {process.pid}")
+        return process
+
+    @staticmethod
+    async def _wait_exit(process: multiprocessing.Process):
+        # the process sentinel becomes readable when the process exits.
+
+        loop = asyncio.get_event_loop()
+        exited = loop.create_future()
+        loop.add_reader(process.sentinel, exited.set_result, None)
+
+        try:
+            await exited
+        finally:
+            loop.remove_reader(process.sentinel)
+            process.join()
+
+    async def _receive(self, sock: socket.socket):
+        """ deliver the payloads forwarded by a worker until it disconnects """
+        reader, writer = await asyncio.open_connection(sock=sock)
+
+        try:
+            while True:
+                header = await reader.readexactly(_FRAME_HEADER.size)
+                name_len, payload_len = _FRAME_HEADER.unpack(header)
+                name = (await reader.readexactly(name_len)).decode()
+                payload = await reader.readexactly(payload_len)
+
+                # bound the concurrent deliveries per exporter; while waiting,
+                # the worker is held back by the socket flow control.
+
+                await self._deliveries[name].acquire()
+                self._add_task(self._deliver(name, payload))
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+        finally:
+            writer.close()
+
+    def _add_task(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, name: str, payload: bytes):
+        try:
+            await self.exporters[name].deliver(payload)
+        finally:
+            self._deliveries[name].release()
@@ -26,11 +26,14 @@ def requirements(filename="requirements.txt"):
 with open("README.md", "r") as fh:
     long_description = fh.read()
 
-# builtin extras to support Cisco NX-API and Arista EOS device driver.
+# builtin extras to support Cisco NX-API and Arista EOS device driver, and the
+# optional uvloop event loop and device HTTP/2 support.
 
 extras_require = {
     "nxapi": requirements("requirements-nxapi.txt"),
     "eapi": requirements("requirements-eapi.txt"),
+    "uvloop": requirements("requirements-uvloop.txt"),
+    "http2": requirements("requirements-http2.txt"),
 }
 
 # add the option for all optional extras
@@ -44,7 +47,7 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     author="Jeremy Schulman",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     include_package_data=True,
     install_requires=requirements(),
     extras_require=extras_require,
@@ -60,6 +63,7 @@ setup(
         "nwka_netmon.exporters": [
             "circonus = nwkatk_netmon.exporters.circonus:CirconusExporter",
             "influxdb = nwkatk_netmon.exporters.influxdb:InfluxDBExporter",
+            "prometheus = nwkatk_netmon.exporters.prometheus:PrometheusExporter",
         ],
     },
     classifiers=[